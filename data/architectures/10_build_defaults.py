@@ -7,6 +7,15 @@ debian_security_mirror = "http://deb.debian.org/debian"
 # Custom vyos apt mirror
 vyos_mirror = "http://dev.packages.vyos.net/repositories/current"
 
+# Port of the caching APT proxy used by live-build and pbuilder
+# (scripts/apt_pool.py), 0 downloads straight from the mirrors
+apt_pool_port = 3142
+
+# Unpack the pbuilder base chroot on tmpfs (/dev/shm) for package builds,
+# and share a ccache between all of them
+pbuilder_tmpfs = False
+pbuilder_ccache = True
+
 # vyos version information
 release_train = "sagitta"
 vyos_branch = "current"
@@ -14,6 +23,23 @@ vyos_branch = "current"
 # linux kernel version information
 kernel_version = "5.10.77"
 
+# Pin all timestamps to SOURCE_DATE_EPOCH or the commit time,
+# so the same inputs give a bit-identical image
+reproducible = False
+
+# initramfs of the image (scripts/BuildPreparation/initramfs_config.py):
+#   modules: "most" (the Debian default, boots on any hardware) or a list
+#            of the modules the target needs to find its root filesystem
+#   compression: <compressor>[:<level>], None keeps the Debian default,
+#            the kernel must be able to decompress it (CONFIG_RD_*)
+#   hooks: extra initramfs-tools hooks to include
+initramfs_profile = {
+    'name': 'default',
+    'modules': 'most',
+    'compression': None,
+    'hooks': [],
+}
+
 # ['release', 'development']
 build_type = "development"
 
@@ -22,6 +48,10 @@ custom_packages = []
 
 custom_apt_key = []
 
+# squashfs compression profile, <type>[:<level>] with type one of
+# gzip, lz4, lzo, xz or zstd, e.g. "zstd:19" (see scripts/compression.py)
+squashfs_compression = "xz"
+
 def __get_default_built_by() -> str:
     import getpass
     import platform
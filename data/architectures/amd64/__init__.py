@@ -1,8 +1,6 @@
-from . import generic_iso
-
-# Dell vep targets
-from . import vep4600
-from . import vep1400
-
-# Amazon Web Services EC2 with cloud-init
-from . import aws
+# Every public module in this folder is a build target, e.g. generic_iso.py,
+# the Dell VEP targets (vep4600.py, vep1400.py) or Amazon Web Services EC2
+# with cloud-init (aws.py).
+#
+# Targets are discovered from the file names and only the selected one
+# is imported, so do not import them here.
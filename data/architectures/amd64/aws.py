@@ -1,5 +1,14 @@
 from .generic_iso import *
 
+# EC2 instances boot from NVMe (Nitro) or Xen block devices
+initramfs_profile = {
+    'name': 'aws',
+    'modules': ['nvme', 'xen_blkfront', 'virtio_pci', 'virtio_blk', 'virtio_scsi', 'sd_mod', 'ext4', 'loop',
+                'squashfs', 'overlay'],
+    'compression': 'gzip:9',
+    'hooks': [],
+}
+
 
 def _configure_hook(build_config: dict) -> None:
     # run parent hook
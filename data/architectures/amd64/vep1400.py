@@ -1,5 +1,16 @@
 from .generic_iso import *
 
+# The VEP appliances boot from their SATA/NVMe/eMMC storage or a USB stick,
+# the initramfs only needs the drivers for those (the network drivers
+# are added by 10-vyos-addons)
+initramfs_profile = {
+    'name': 'vep1400',
+    'modules': ['ahci', 'sd_mod', 'nvme', 'mmc_block', 'sdhci_pci', 'xhci_pci', 'ehci_pci', 'usb_storage',
+                'sr_mod', 'isofs', 'vfat', 'nls_ascii', 'ext4', 'loop', 'squashfs', 'overlay'],
+    'compression': 'gzip:9',
+    'hooks': ['data/architectures/amd64/dell/vep-hook'],
+}
+
 
 def _configure_hook(build_config: dict) -> None:
     # run parent hook
@@ -9,7 +20,6 @@ def _configure_hook(build_config: dict) -> None:
     import os
     import shutil
     os.makedirs('build/config/includes.chroot/etc/systemd/network')
-    os.makedirs('build/config/includes.chroot/usr/share/initramfs-tools/hooks')
     shutil.copy('data/architectures/amd64/dell/90-vep.chroot', 'build/config/hooks/live/')
     for file in [f for f in os.listdir('data/architectures/amd64/dell/vep1400/') 
         if os.path.isfile(os.path.join('data/architectures/amd64/dell/vep1400/', f))]:
@@ -18,5 +28,3 @@ def _configure_hook(build_config: dict) -> None:
                 os.path.join('data/architectures/amd64/dell/vep1400/', file),
                 'build/config/includes.chroot/etc/systemd/network/'
             )
-    shutil.copy('data/architectures/amd64/dell/vep-hook', 'build/config/includes.chroot/usr/share/initramfs-tools/hooks/')
-
@@ -1,2 +1,4 @@
-from . import rpi_cm4
-
+# Every public module in this folder is a build target, e.g. rpi_cm4.py.
+#
+# Targets are discovered from the file names and only the selected one
+# is imported, so do not import them here.
@@ -2,6 +2,25 @@
 CWD=$(pwd)
 KERNEL_SRC=linux
 
+# Usage: build-kernel.sh [--incremental] [--no-tools]
+#
+# --incremental keeps the objects in a persistent out-of-tree build
+# directory (KERNEL_BUILD_DIR, default: linux-build), only re-applies the
+# patches that changed since the last build, compiles through ccache if it
+# is installed and skips the build if nothing changed at all.
+# --no-tools does not build the linux-perf/tools packages.
+INCREMENTAL=0
+# builddeb of patches/kernel/0003 builds the tools if BUILD_TOOLS is set at all
+TOOLS_ARG="BUILD_TOOLS=1"
+for arg in "$@"
+do
+    case ${arg} in
+        --incremental) INCREMENTAL=1 ;;
+        --no-tools) TOOLS_ARG="" ;;
+        *) echo "Unknown option: ${arg}"; exit 1 ;;
+    esac
+done
+
 if [ ! -d ${KERNEL_SRC} ]; then
     echo "Linux Kernel source directory does not exists, please 'git clone'"
     exit 1
@@ -12,9 +31,6 @@ cp -rv arch/ ${KERNEL_SRC}/
 
 cd ${KERNEL_SRC}
 
-echo "I: clean modified files"
-git reset --hard HEAD
-
 KERNEL_VERSION=$(make kernelversion)
 KERNEL_SUFFIX=-$(dpkg --print-architecture)-vyos
 
@@ -23,32 +39,127 @@ KERNEL_SUFFIX=-$(dpkg --print-architecture)-vyos
 # repository instead of maintaining a full Kernel Fork.
 # Saving time/resources is essential :-)
 PATCH_DIR=${CWD}/patches/kernel
-for patch in $(ls ${PATCH_DIR})
-do
-    echo "I: Apply Kernel patch: ${PATCH_DIR}/${patch}"
-    patch -p1 < ${PATCH_DIR}/${patch}
-done
+BUILD_DIR=${KERNEL_BUILD_DIR:-${CWD}/linux-build}
+
+if [ ${INCREMENTAL} -eq 0 ]; then
+    echo "I: clean modified files"
+    git reset --hard HEAD
+    # the patches are applied in place again, the state of an earlier
+    # --incremental build no longer matches the source tree
+    rm -rf ${BUILD_DIR}/applied-patches ${BUILD_DIR}/.vyos-inputs
+
+    for patch in $(ls ${PATCH_DIR})
+    do
+        echo "I: Apply Kernel patch: ${PATCH_DIR}/${patch}"
+        patch -p1 < ${PATCH_DIR}/${patch}
+    done
 
-echo "I: make vyos_defconfig"
-# Select Kernel configuration - currently there is only one
-make vyos_defconfig
+    echo "I: make vyos_defconfig"
+    # Select Kernel configuration - currently there is only one
+    make vyos_defconfig
+    KERNEL_DIR=${CWD}/${KERNEL_SRC}
+    MAKE_ARGS=""
+else
+    mkdir -p ${BUILD_DIR}/applied-patches
+
+    # Copies of the applied patches are kept in the build directory. Patches
+    # are applied in order, so everything after the first one that changed
+    # is reverted (newest first) and applied again, files touched only by
+    # the unchanged patches before it keep their timestamps and objects.
+    APPLIED=$(ls ${BUILD_DIR}/applied-patches)
+    WANTED=$(ls ${PATCH_DIR})
+    if [ -z "${APPLIED}" ] && [ -d .git ]; then
+        echo "I: clean modified files"
+        git reset --hard HEAD
+    fi
+    KEPT=0
+    for patch in ${WANTED}
+    do
+        applied=$(echo "${APPLIED}" | sed -n "$(( KEPT + 1 ))p")
+        if [ "${applied}" != "${patch}" ] || ! cmp -s ${PATCH_DIR}/${patch} ${BUILD_DIR}/applied-patches/${patch}; then
+            break
+        fi
+        KEPT=$(( KEPT + 1 ))
+    done
+
+    for patch in $(echo "${APPLIED}" | tail -n +$(( KEPT + 1 )) | sort -r)
+    do
+        echo "I: Revert Kernel patch: ${patch}"
+        patch -R -p1 < ${BUILD_DIR}/applied-patches/${patch} || exit 1
+        rm ${BUILD_DIR}/applied-patches/${patch}
+    done
+    for patch in $(echo "${WANTED}" | tail -n +$(( KEPT + 1 )))
+    do
+        echo "I: Apply Kernel patch: ${PATCH_DIR}/${patch}"
+        patch -p1 < ${PATCH_DIR}/${patch} || exit 1
+        cp ${PATCH_DIR}/${patch} ${BUILD_DIR}/applied-patches/
+    done
+    if [ ${KEPT} -gt 0 ]; then
+        echo "I: ${KEPT} Kernel patches unchanged"
+    fi
+
+    if [ -f .config ]; then
+        echo "I: Remove the in-tree build, out-of-tree builds need a clean source tree"
+        make mrproper
+    fi
+
+    # kconfig only rewrites the headers of changed options, so only the
+    # objects depending on them are rebuilt
+    echo "I: make vyos_defconfig"
+    make O=${BUILD_DIR} vyos_defconfig
+
+    MAKE_ARGS="O=${BUILD_DIR}"
+    if command -v ccache > /dev/null; then
+        echo "I: Compiling through ccache"
+        MAKE_ARGS="${MAKE_ARGS} CC=ccache\ ${CROSS_COMPILE}gcc"
+    fi
+
+    # modules are built against the build directory
+    KERNEL_DIR=${BUILD_DIR}
+
+    # nothing to do if the sources, patches, config and options are the same
+    INPUTS=$( (echo ${KERNEL_VERSION} ${TOOLS_ARG}; [ -d .git ] && git rev-parse HEAD; \
+               cat ${PATCH_DIR}/* ${BUILD_DIR}/.config) | sha256sum | cut -d' ' -f1)
+    if [ "$(cat ${BUILD_DIR}/.vyos-inputs 2>/dev/null)" = "${INPUTS}" ] && \
+       ls ${CWD}/linux-image-${KERNEL_VERSION}${KERNEL_SUFFIX}_*.deb > /dev/null 2>&1; then
+        echo "I: Kernel sources, patches and config are unchanged, keeping the existing packages"
+        SKIP_BUILD=1
+    fi
+fi
 
 echo "I: Generate environment file containing Kernel variable"
 cat << EOF >${CWD}/kernel-vars
 #!/bin/sh
 export KERNEL_VERSION=${KERNEL_VERSION}
 export KERNEL_SUFFIX=${KERNEL_SUFFIX}
-export KERNEL_DIR=${CWD}/${KERNEL_SRC}
+export KERNEL_DIR=${KERNEL_DIR}
 EOF
 
-echo "I: Build Debian Kernel package"
-touch .scmversion
-make bindeb-pkg BUILD_TOOLS=1 LOCALVERSION=${KERNEL_SUFFIX} KDEB_PKGVERSION=${KERNEL_VERSION}-1 -j $(getconf _NPROCESSORS_ONLN)
+if [ ! -f .scmversion ]; then
+    touch .scmversion
+fi
+if [ -z "${SKIP_BUILD}" ]; then
+    echo "I: Build Debian Kernel package"
+    if [ -z "${TOOLS_ARG}" ]; then
+        echo "I: Not building the linux-perf/tools packages"
+    fi
+    eval make ${MAKE_ARGS} bindeb-pkg ${TOOLS_ARG} LOCALVERSION=${KERNEL_SUFFIX} \
+        KDEB_PKGVERSION=${KERNEL_VERSION}-1 -j $(getconf _NPROCESSORS_ONLN)
+    RESULT=$?
+    if [ ${RESULT} -ne 0 ]; then
+        exit ${RESULT}
+    fi
+    if [ ${INCREMENTAL} -eq 1 ]; then
+        echo ${INPUTS} > ${BUILD_DIR}/.vyos-inputs
+        # bindeb-pkg writes the packages next to the build directory
+        if [ "$(dirname ${BUILD_DIR})" != "${CWD}" ]; then
+            mv $(dirname ${BUILD_DIR})/linux-*.deb ${CWD}/
+        fi
+    fi
+fi
 
 cd $CWD
-if [[ $? == 0 ]]; then
-    for package in $(ls linux-*.deb)
-    do
-        ln -sf linux-kernel/$package ..
-    done
-fi
+for package in $(ls linux-*.deb)
+do
+    ln -sf linux-kernel/$package ..
+done
@@ -25,8 +25,17 @@ fi
 . ${KERNEL_VAR_FILE}
 
 result=()
+# bindeb-pkg stages the modules below the build directory of the kernel,
+# the source tree or the out-of-tree directory of an incremental build
+MODULES_DIR=${KERNEL_DIR:-${CWD}/${LINUX_SRC}}/debian/linux-image/lib/modules/${KERNEL_VERSION}${KERNEL_SUFFIX}
+NET_MODULES=$(find ${MODULES_DIR}/kernel/drivers/net -name '*.ko' 2>/dev/null)
+if [ -z "${NET_MODULES}" ]; then
+    echo "E: No network driver modules found in ${MODULES_DIR}, build the kernel first"
+    exit 1
+fi
+
 # Retrieve firmware blobs from source files
-FW_FILES=$(find ${LINUX_SRC}/debian/linux-image/lib/modules/${KERNEL_VERSION}${KERNEL_SUFFIX}/kernel/drivers/net -name *.ko | xargs modinfo | grep "^firmware:" | awk '{print $2}')
+FW_FILES=$(echo "${NET_MODULES}" | xargs modinfo | grep "^firmware:" | awk '{print $2}')
 
 # Debian package will use the descriptive Git commit as version
 GIT_COMMIT=$(cd ${CWD}/${LINUX_FIRMWARE}; git describe --always)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: incremental-sync
+# Purpose:
+#   Keeps a staged directory (the live-build config dir) in sync with its
+#   sources by only touching files that actually changed.
+#   A content hash manifest is kept next to the staged directory, so files
+#   that did not change stay byte- and mtime-identical between runs.
+
+
+import os
+import json
+import shutil
+
+import util
+
+# Files with these suffixes are placed with a reflink or hardlink
+# instead of a copy, they are only ever read by live-build
+LINK_SUFFIXES = ('.deb',)
+
+
+def collect_tree(src_dir: str, dst_prefix: str = '') -> 'dict[str, str]':
+    """Map every file below src_dir to its path relative to the staged dir. """
+    files = {}
+    for root, dirs, filenames in os.walk(src_dir, followlinks=True):
+        for name in filenames:
+            src = os.path.join(root, name)
+            rel = os.path.join(dst_prefix, os.path.relpath(src, src_dir))
+            files[os.path.normpath(rel)] = src
+    return files
+
+
+def _load_manifest(manifest_file: str) -> dict:
+    try:
+        with open(manifest_file, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {'sources': {}, 'files': {}}
+    manifest.setdefault('sources', {})
+    manifest.setdefault('files', {})
+    return manifest
+
+
+def _source_hash(src: str, st: os.stat_result, cache: dict) -> str:
+    """Return the content hash of a source file, reusing the cached one
+    if neither size nor mtime changed since the last run. """
+    cached = cache.get(src)
+    if cached and cached['size'] == st.st_size and cached['mtime_ns'] == st.st_mtime_ns:
+        return cached['sha256']
+    return util.sha256_file(src)
+
+
+def sync(sources: 'dict[str, str]', dst_dir: str, manifest_file: str, debug: bool = False) -> dict:
+    """Make dst_dir contain exactly the files from sources (relative path -> source path).
+
+    Unchanged files are left alone, changed ones are replaced and files
+    that are not part of sources are removed, including ones generated
+    into dst_dir by later build steps (lb config output, version files,
+    target configure hooks), as those are recreated on every run anyway.
+    Returns counters of what has been done. """
+    old = _load_manifest(manifest_file)
+    new = {'sources': {}, 'files': {}}
+    stats = {'kept': 0, 'copied': 0, 'linked': 0, 'removed': 0}
+
+    os.makedirs(dst_dir, exist_ok=True)
+
+    for rel, src in sorted(sources.items()):
+        st = os.stat(src)
+        digest = _source_hash(src, st, old['sources'])
+        new['sources'][src] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha256': digest}
+
+        dst = os.path.join(dst_dir, rel)
+        recorded = old['files'].get(rel)
+        try:
+            dst_st = os.stat(dst)
+        except FileNotFoundError:
+            dst_st = None
+
+        if dst_st is not None and recorded is not None and \
+           recorded['sha256'] == digest and \
+           recorded['size'] == dst_st.st_size and \
+           recorded['mtime_ns'] == dst_st.st_mtime_ns:
+            if (dst_st.st_mode & 0o7777) != (st.st_mode & 0o7777):
+                os.chmod(dst, st.st_mode & 0o7777)
+            stats['kept'] += 1
+        else:
+            # Never write into an existing file, it may be a hardlink to its source
+            if os.path.lexists(dst):
+                os.unlink(dst)
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            if rel.endswith(LINK_SUFFIXES):
+                method = util.link_or_copy(src, dst)
+                stats['copied' if method == 'copy' else 'linked'] += 1
+            else:
+                shutil.copy2(src, dst)
+                method = 'copy'
+                stats['copied'] += 1
+            if debug:
+                print("Updated {0} ({1})".format(rel, method))
+            dst_st = os.stat(dst)
+
+        new['files'][rel] = {'sha256': digest, 'size': dst_st.st_size, 'mtime_ns': dst_st.st_mtime_ns}
+
+    # Remove everything that is not (or no longer) part of the sources,
+    # deepest paths first so emptied directories can be removed as well
+    wanted_dirs = {os.path.dirname(rel) for rel in sources}
+    for rel in list(wanted_dirs):
+        while rel:
+            rel = os.path.dirname(rel)
+            wanted_dirs.add(rel)
+
+    for root, dirs, filenames in os.walk(dst_dir, topdown=False):
+        rel_root = os.path.normpath(os.path.relpath(root, dst_dir))
+        rel_root = '' if rel_root == '.' else rel_root
+        for name in filenames + [d for d in dirs if os.path.islink(os.path.join(root, d))]:
+            rel = os.path.join(rel_root, name)
+            if rel not in sources:
+                os.unlink(os.path.join(root, name))
+                stats['removed'] += 1
+                if debug:
+                    print("Removed {0}".format(rel))
+        if rel_root and rel_root not in wanted_dirs and not os.listdir(root):
+            os.rmdir(root)
+
+    with open(manifest_file, 'w') as f:
+        json.dump(new, f, indent=4, sort_keys=True)
+
+    return stats
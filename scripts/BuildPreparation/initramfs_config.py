@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: initramfs_config.py
+# Purpose:
+#   Renders the initramfs profile of the build target (the
+#   initramfs_profile option) into the initramfs-tools config of the
+#   chroot. The 17-gen_initramfs hook and the 10-vyos-addons
+#   initramfs-tools hook apply it when the initramfs is generated.
+
+
+import os
+import re
+import sys
+import shutil
+
+# mkinitramfs compressors with their level range
+COMPRESSORS = {
+    'bzip2': (1, 9),
+    'gzip': (1, 9),
+    'lz4': (1, 12),
+    'lzma': (0, 9),
+    'lzop': (1, 9),
+    'xz': (0, 9),
+    'zstd': (1, 19),
+}
+
+DEFAULT_PROFILE = {
+    'name': 'default',
+    'modules': 'most',
+    'compression': None,
+    'hooks': [],
+}
+
+# Relative to the live-build config dir
+CONF_FILE = 'includes.chroot/etc/initramfs-tools/conf.d/vyos-profile'
+MODULES_FILE = 'includes.chroot/etc/initramfs-tools/vyos-profile.modules'
+HOOKS_DIR = 'includes.chroot/etc/initramfs-tools/hooks'
+
+# Extra hooks of a profile are copied with this prefix, so the ones of
+# an earlier profile can be told apart and removed
+HOOK_PREFIX = 'profile-'
+
+
+def parse_profile(profile: dict) -> dict:
+    """Return the profile completed with the defaults and its compressor
+    and level. Raises ValueError for unknown or invalid settings. """
+    unknown = set(profile) - set(DEFAULT_PROFILE)
+    if unknown:
+        raise ValueError('Unknown initramfs profile settings: {0}'.format(', '.join(sorted(unknown))))
+    result = dict(DEFAULT_PROFILE)
+    result.update(profile)
+    if not re.match(r'^[\w.-]+$', result['name']):
+        raise ValueError('Invalid initramfs profile name "{0}"'.format(result['name']))
+
+    modules = result['modules']
+    if modules != 'most' and not (isinstance(modules, list) and all(isinstance(m, str) for m in modules)):
+        raise ValueError('The initramfs modules must be "most" or a list of module names')
+
+    result['compressor'], result['level'] = None, None
+    if result['compression']:
+        compressor, _, level = result['compression'].partition(':')
+        if compressor not in COMPRESSORS:
+            raise ValueError('Unknown initramfs compressor "{0}", use one of {1}'.format(
+                             compressor, ', '.join(sorted(COMPRESSORS))))
+        if level:
+            low, high = COMPRESSORS[compressor]
+            if not level.isdigit() or not low <= int(level) <= high:
+                raise ValueError('The {0} compression level must be between {1} and {2}'.format(
+                                 compressor, low, high))
+            result['level'] = int(level)
+        result['compressor'] = compressor
+
+    for hook in result['hooks']:
+        if not os.path.isfile(hook):
+            raise ValueError('initramfs hook {0} does not exist'.format(hook))
+    return result
+
+
+def write(build_config: dict) -> None:
+    try:
+        profile = parse_profile(build_config.get('initramfs_profile') or {})
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    print("Writing initramfs profile {0}".format(profile['name']))
+    lb_config_dir = os.path.join(build_config['build_dir'], 'config')
+
+    conf = ['# initramfs profile of the build target, written by build-config',
+            'VYOS_INITRAMFS_PROFILE={0}'.format(profile['name']),
+            'MODULES={0}'.format('most' if profile['modules'] == 'most' else 'list')]
+    if profile['compressor']:
+        conf.append('COMPRESS={0}'.format(profile['compressor']))
+    if profile['level'] is not None:
+        conf.append('COMPRESSLEVEL={0}'.format(profile['level']))
+    conf_file = os.path.join(lb_config_dir, CONF_FILE)
+    os.makedirs(os.path.dirname(conf_file), exist_ok=True)
+    with open(conf_file, 'w') as f:
+        f.write('\n'.join(conf) + '\n')
+
+    # included by 10-vyos-addons, udev loads them if the hardware is present
+    with open(os.path.join(lb_config_dir, MODULES_FILE), 'w') as f:
+        f.write('# modules of initramfs profile {0}\n'.format(profile['name']))
+        if profile['modules'] != 'most':
+            f.write(''.join(m + '\n' for m in profile['modules']))
+
+    hooks_dir = os.path.join(lb_config_dir, HOOKS_DIR)
+    os.makedirs(hooks_dir, exist_ok=True)
+    for name in os.listdir(hooks_dir):
+        if name.startswith(HOOK_PREFIX):
+            os.unlink(os.path.join(hooks_dir, name))
+    for hook in profile['hooks']:
+        dst = os.path.join(hooks_dir, HOOK_PREFIX + os.path.basename(hook))
+        shutil.copy(hook, dst)
+        os.chmod(dst, 0o755)
@@ -28,6 +28,8 @@ import subprocess
 
 import defaults
 import util
+import compression
+import apt_pool
 
 def write(build_config: dict) -> None:
 
@@ -66,6 +68,14 @@ def write(build_config: dict) -> None:
         "debug": None,
     }
 
+    # the compression level and options are passed to mksquashfs by lb-build
+    profile = compression.parse_profile(build_config.get('squashfs_compression', 'xz'))
+    lb_arguments["chroot-squashfs-compression-type"] = profile['compressor']
+
+    # download through the APT pool proxy lb-build runs during the build
+    if build_config.get('apt_pool_port'):
+        lb_arguments["apt-http-proxy"] = apt_pool.proxy_url(build_config['apt_pool_port'])
+
     debug = build_config['debug']
 
     # Add the additional repositories to package lists
@@ -118,7 +128,12 @@ def write(build_config: dict) -> None:
         if value is not None:
             lb_config_command.append(value)
 
-    result = subprocess.call(lb_config_command, cwd=defaults.BUILD_DIR)
+    # live-build saves SOURCE_DATE_EPOCH in its config and passes it on
+    env = dict(os.environ)
+    if build_config.get('source_date_epoch') is not None:
+        env['SOURCE_DATE_EPOCH'] = str(build_config['source_date_epoch'])
+
+    result = subprocess.call(lb_config_command, cwd=defaults.BUILD_DIR, env=env)
     if result > 0:
         print("live-build config failed")
         sys.exit(1)
@@ -21,40 +21,117 @@
 #   and install/upgrade scripts.
 
 import os
+import sys
 import datetime
 import json
 import uuid
+import zlib
+import subprocess
 
 import git
 
 import defaults
 import util
+import fingerprint
+
+GIT_DIR = '.git'
+
+# Namespace of the build UUIDs of reproducible builds
+BUILD_UUID_NAMESPACE = uuid.UUID('5b1f7c4e-3a38-4a6e-9a51-0c8a3e2f6d10')
+
+
+def read_git_head(git_dir=GIT_DIR):
+    """Return the commit ID, branch name (empty if detached) and commit time
+    of HEAD, read from the .git directory without looking at the work tree. """
+    if os.path.isfile(git_dir):
+        # worktree or submodule, .git points to the real git dir
+        with open(git_dir, 'r') as f:
+            git_dir = os.path.join(os.path.dirname(git_dir), f.read().split(':', 1)[1].strip())
+    # the git dir of a worktree only holds HEAD, the refs and objects are in
+    # the git dir of the main work tree its commondir file names
+    common_dir = git_dir
+    if os.path.isfile(os.path.join(git_dir, 'commondir')):
+        with open(os.path.join(git_dir, 'commondir'), 'r') as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+
+    with open(os.path.join(git_dir, 'HEAD'), 'r') as f:
+        head = f.read().strip()
+    branch = ''
+    commit = head
+    if head.startswith('ref: '):
+        ref = head[5:]
+        branch = ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ''
+        commit = None
+        ref_files = [os.path.join(d, ref) for d in (git_dir, common_dir) if os.path.isfile(os.path.join(d, ref))]
+        if ref_files:
+            with open(ref_files[0], 'r') as f:
+                commit = f.read().strip()
+        elif os.path.isfile(os.path.join(common_dir, 'packed-refs')):
+            with open(os.path.join(common_dir, 'packed-refs'), 'r') as f:
+                for line in f:
+                    if line.rstrip('\n').endswith(' ' + ref):
+                        commit = line.split()[0]
+        if not commit:
+            raise ValueError("{0} does not point to a commit".format(ref))
+
+    obj = os.path.join(common_dir, 'objects', commit[:2], commit[2:])
+    if os.path.isfile(obj):
+        with open(obj, 'rb') as f:
+            data = zlib.decompress(f.read())
+        header = data.split(b'\n\n', 1)[0].split(b'\0', 1)[1]
+        committer = [l for l in header.split(b'\n') if l.startswith(b'committer ')][0]
+        commit_time = int(committer.rsplit(b' ', 2)[1])
+    else:
+        # packed object, git reads it without checking the work tree either
+        commit_time = int(subprocess.check_output(['git', 'show', '-s', '--format=%ct', commit]).strip())
+
+    return {'commit': commit, 'branch': branch, 'commit_time': commit_time}
+
+
+def source_date_epoch():
+    """Return the time reproducible builds are pinned to, SOURCE_DATE_EPOCH
+    from the environment or the time of the checked out commit. """
+    if os.environ.get('SOURCE_DATE_EPOCH'):
+        return int(os.environ['SOURCE_DATE_EPOCH'])
+    try:
+        return read_git_head()['commit_time']
+    except (OSError, ValueError, IndexError, zlib.error, subprocess.CalledProcessError) as e:
+        print("Reproducible builds need SOURCE_DATE_EPOCH or a git checkout: {0}".format(e))
+        sys.exit(1)
 
 
 def make_version_file(build_config):
+    reproducible = build_config.get('reproducible')
 
     # Create a build timestamp
-    now = datetime.datetime.today()
+    if reproducible:
+        now = datetime.datetime.fromtimestamp(build_config['source_date_epoch'], datetime.timezone.utc)
+    else:
+        now = datetime.datetime.today()
     build_timestamp = now.strftime("%Y%m%d%H%M")
 
     # FIXME: use aware rather than naive object
     build_date = now.strftime("%a %d %b %Y %H:%M UTC")
 
-    # Assign a (hopefully) unique identifier to the build (UUID)
-    build_uuid = str(uuid.uuid4())
-
     # Initialize Git object from our repository
     try:
-        repo = git.Repo('.')
-
-        # Retrieve the Git commit ID of the repository, 14 charaters will be sufficient
-        build_git = repo.head.object.hexsha[:14]
-        # If somone played around with the source tree and the build is "dirty", mark it
-        if repo.is_dirty():
-            build_git += "-dirty"
-
-        # Retrieve git branch name
-        git_branch = repo.active_branch.name
+        if reproducible:
+            # no dirty check, it stats the whole work tree and only
+            # the committed sources can be reproduced anyway
+            head = read_git_head()
+            build_git = head['commit'][:14]
+            git_branch = head['branch']
+        else:
+            repo = git.Repo('.')
+
+            # Retrieve the Git commit ID of the repository, 14 charaters will be sufficient
+            build_git = repo.head.object.hexsha[:14]
+            # If somone played around with the source tree and the build is "dirty", mark it
+            if repo.is_dirty():
+                build_git += "-dirty"
+
+            # Retrieve git branch name
+            git_branch = repo.active_branch.name
     except Exception as e:
         print("Could not retrieve information from git: {0}".format(str(e)))
         build_git = ""
@@ -81,6 +158,14 @@ def make_version_file(build_config):
         # Release build, use the version from ./configure arguments
         version = build_config['version']
 
+    # Assign a (hopefully) unique identifier to the build (UUID),
+    # reproducible builds derive it from their inputs
+    if reproducible:
+        build_uuid = str(uuid.uuid5(BUILD_UUID_NAMESPACE, '{0}:{1}:{2}'.format(
+                         fingerprint.hash_config(build_config), version, build_git)))
+    else:
+        build_uuid = str(uuid.uuid4())
+
     if build_config['build_type'] == 'development':
         lts_build = False
     else:
@@ -1,29 +1,53 @@
 import os
 import shutil
 
+import defaults
+
+from . import incremental_sync
+from . import initramfs_config
 from . import live_build_config
 from . import make_version_file
 
+PKG_SRC_DIR = 'packages/'
+PKG_DST_DIR = os.path.join(defaults.LB_CONFIG_DIR, 'packages.chroot')
+DEV_PACKAGE_LIST = 'data/package-lists/vyos-dev.list.chroot'
+
 
 def prepare(build_config: dict) -> None:
     """Copy the platform-independent live-build config files and run lb config."""
-    if os.path.isdir('build/config/'):
-        shutil.rmtree('build/config/')
-    shutil.copytree('data/live-build-config/', 'build/config/')
+    if build_config.get('incremental_config'):
+        stage_incremental(build_config)
+    else:
+        if os.path.isdir('build/config/'):
+            shutil.rmtree('build/config/')
+        shutil.copytree('data/live-build-config/', 'build/config/')
+        import_local_packages()
+        if build_config['build_type'] == 'development':
+            shutil.copy(DEV_PACKAGE_LIST, 'build/config/package-lists/')
     live_build_config.write(build_config)
-    import_local_packages()
+    initramfs_config.write(build_config)
     make_version_file.make_version_file(build_config)
+
+def stage_incremental(build_config: dict) -> None:
+    """Sync the live-build config dir and local packages, only touching changed files. """
+    print("Synchronizing live-build config incrementally")
+    sources = incremental_sync.collect_tree('data/live-build-config/')
+    for file in list_local_packages():
+        sources[os.path.join('packages.chroot', file)] = os.path.join(PKG_SRC_DIR, file)
     if build_config['build_type'] == 'development':
-        shutil.copy('data/package-lists/vyos-dev.list.chroot', 'build/config/package-lists/')
+        sources[os.path.join('package-lists', os.path.basename(DEV_PACKAGE_LIST))] = DEV_PACKAGE_LIST
+    stats = incremental_sync.sync(sources, defaults.LB_CONFIG_DIR, defaults.LB_CONFIG_MANIFEST,
+                                  debug=build_config['debug'])
+    print("{kept} files unchanged, {copied} copied, {linked} linked, {removed} removed".format(**stats))
+
+def list_local_packages() -> list:
+    """Return the names of all .deb files in the local package dir. """
+    return sorted([f for f in os.listdir(PKG_SRC_DIR)
+                   if f.endswith('.deb') and os.path.isfile(os.path.join(PKG_SRC_DIR, f))])
 
 def import_local_packages() -> None:
     """Copy local packages into live-build path. """
-    PKG_SRC_DIR = 'packages/'
-    PKG_DST_DIR = 'build/config/packages.chroot/'
     if not os.path.isdir(PKG_DST_DIR):
         os.makedirs(PKG_DST_DIR)
-    for file in [f for f in os.listdir(PKG_SRC_DIR) 
-			if os.path.isfile(os.path.join(PKG_SRC_DIR, f))]:
-        if file.endswith('.deb'):
-            shutil.copy(os.path.join(PKG_SRC_DIR, file), PKG_DST_DIR)
-
+    for file in list_local_packages():
+        shutil.copy(os.path.join(PKG_SRC_DIR, file), PKG_DST_DIR)
@@ -1,28 +1,104 @@
-import pkgutil as _pkgutil
+import os as _os
+import sys as _sys
+import json as _json
+import importlib as _importlib
+import importlib.util as _importlib_util
+
+import defaults as _defaults
 
 # current module directory, then append the directory 'architectures', which
 # is symlinked to data/architectures
-__ARCH_PACKAGE_PATH = [__path__[0] + '/architectures']
+__ARCH_PACKAGE_PATH = _os.path.join(__path__[0], 'architectures')
+
 
-class __ArchitectureModuleLoader():
-    def __init__(self, architecture_path: str) -> None:
+class __ArchitectureIndex():
+    """Index of the architecture packages and their target modules.
+
+    The index is built from file names only, no architecture or target code
+    is executed to build it. It is cached on disk and rebuilt whenever the
+    mtime of one of the scanned directories changes (a module was added,
+    removed or renamed). """
+    def __init__(self, architecture_path: str, cache_file: str) -> None:
         self.__architecture_path = architecture_path
-        self.arch_modules = []
-        self.default_files = []
-
-    def discover_modules(self) -> list:
-        arch_modules = list(_pkgutil.walk_packages(self.__architecture_path))
-        for module_info in arch_modules:
-            module = module_info.module_finder.find_module(module_info.name).load_module(module_info.name)
-            if module_info.ispkg:  # module is package (architecture folder)
-                self.arch_modules.append(module)
-            else:  # module is a platform-independent config file in the folder
-                self.default_files.append(module)
-
-# instanciate the ModuleLoader and let it find the arch submodules
-__module_loader = __ArchitectureModuleLoader(__ARCH_PACKAGE_PATH)
-__module_loader.discover_modules()
-
-# set easily accessible variables for use in other modules
-ARCH_MODULES = __module_loader.arch_modules
-DEFAULT_MODULES = __module_loader.default_files
+        self.__cache_file = cache_file
+        self.__index = None
+
+    def __directory_mtimes(self, index: dict) -> dict:
+        dirs = [self.__architecture_path] + [
+            _os.path.join(self.__architecture_path, arch) for arch in index['architectures']
+        ]
+        return {d: _os.stat(d).st_mtime_ns for d in dirs}
+
+    def __scan(self) -> dict:
+        index = {'default_modules': [], 'architectures': {}}
+        for entry in sorted(_os.listdir(self.__architecture_path)):
+            path = _os.path.join(self.__architecture_path, entry)
+            if _os.path.isdir(path) and _os.path.isfile(_os.path.join(path, '__init__.py')):
+                # package (architecture folder), every public module in it is a target
+                index['architectures'][entry] = sorted(
+                    name[:-3] for name in _os.listdir(path)
+                    if name.endswith('.py') and not name.startswith('_')
+                )
+            elif entry.endswith('.py') and not entry.startswith('_'):
+                # platform-independent config file in the folder
+                index['default_modules'].append(entry[:-3])
+        return index
+
+    def __load_cache(self) -> dict:
+        try:
+            with open(self.__cache_file, 'r') as f:
+                cached = _json.load(f)
+            if cached['mtimes'] == self.__directory_mtimes(cached['index']):
+                return cached['index']
+        except (OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def __save_cache(self, index: dict) -> None:
+        try:
+            _os.makedirs(_os.path.dirname(self.__cache_file), exist_ok=True)
+            with open(self.__cache_file, 'w') as f:
+                _json.dump({'mtimes': self.__directory_mtimes(index), 'index': index}, f, indent=4)
+        except OSError:
+            # the cache is an optimization only
+            pass
+
+    @property
+    def index(self) -> dict:
+        if self.__index is None:
+            self.__index = self.__load_cache()
+            if self.__index is None:
+                self.__index = self.__scan()
+                self.__save_cache(self.__index)
+        return self.__index
+
+    def __import(self, name: str, path: str, is_package: bool = False):
+        if name in _sys.modules:
+            return _sys.modules[name]
+        spec = _importlib_util.spec_from_file_location(
+            name, path, submodule_search_locations=[_os.path.dirname(path)] if is_package else None
+        )
+        module = _importlib_util.module_from_spec(spec)
+        _sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del _sys.modules[name]
+            raise
+        return module
+
+    def load_default_modules(self) -> list:
+        """Import all platform-independent config modules. """
+        return [
+            self.__import(name, _os.path.join(self.__architecture_path, name + '.py'))
+            for name in self.index['default_modules']
+        ]
+
+    def load_target(self, arch: str, target: str):
+        """Import a single target module (and its architecture package). """
+        self.__import(arch, _os.path.join(self.__architecture_path, arch, '__init__.py'), is_package=True)
+        return _importlib.import_module('{}.{}'.format(arch, target))
+
+
+# instanciate the index, nothing is scanned or imported until it is used
+ARCH_INDEX = __ArchitectureIndex(__ARCH_PACKAGE_PATH, _defaults.TARGET_INDEX_CACHE)
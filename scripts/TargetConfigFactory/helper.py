@@ -8,48 +8,53 @@ class ConfigGenerator:
     def __init__(self):
         self.__config_cache = None
 
-    def __getitem__(self, key: str) -> object:
-        """Config items should be accessible via config['key']. """
+    @property
+    def _cache(self) -> dict:
+        """The default config is only built when it is used for the first time. """
         if self.__config_cache is None:
             self.rebuild_default_config()
-        if key not in self.__config_cache:
-            print(self.__config_cache)
+        return self.__config_cache
+
+    def __getitem__(self, key: str) -> object:
+        """Config items should be accessible via config['key']. """
+        if key not in self._cache:
+            print(self._cache)
             raise KeyError('Config option \'{}\' not found in any loaded config! '.format(key))
-        return self.__config_cache[key]
+        return self._cache[key]
 
     def __setitem__(self, key: str, value: object) -> None:
         """Config items should be settable via config['key'] = value. """
-        self.__config_cache[key] = value
+        self._cache[key] = value
 
     def __contains__(self, key: str) -> bool:
-        return key in self.__config_cache
+        return key in self._cache
 
     def to_dict(self) -> dict:
         """Export all current config options to a dict. """
-        return self.__config_cache.copy()
+        return self._cache.copy()
 
     def merge(self, data: dict, priority: bool) -> None:
         """Merge config options from a given dict into the local config cache. """
         # keys only found in given data, copy to config cache if not None
-        for key in (set(data.keys()) - set(self.__config_cache.keys())):
+        for key in (set(data.keys()) - set(self._cache.keys())):
             if data[key] is not None:
-                self.__config_cache[key] = data[key]
+                self._cache[key] = data[key]
 
         # merge conflicts
         # -> always append if type is list
         # -> overwrite local if priority is set
-        for key in (set(data.keys()).intersection(set(self.__config_cache.keys()))):
+        for key in (set(data.keys()).intersection(set(self._cache.keys()))):
             if data[key] is None:
                 continue
 
-            if type(data[key]) == list and type(self.__config_cache[key]) == list:
-                data[key] += self.__config_cache[key]
+            if type(data[key]) == list and type(self._cache[key]) == list:
+                data[key] += self._cache[key]
             elif priority:
-                self.__config_cache[key] = data[key]
+                self._cache[key] = data[key]
 
     def apply_module(self, module: types.ModuleType) -> None:
         """Get all declared variables within module scope and update local config cache with it. """
-        self.__config_cache.update({
+        self._cache.update({
             k: v
             for k, v in module.__dict__.items()
             if not k.startswith('_')
@@ -58,7 +63,7 @@ class ConfigGenerator:
     def rebuild_default_config(self) -> None:
         """Parse all platform-independent config files in alphabetical order and load their config options. """
         self.__config_cache = {}
-        module_by_name = {mod.__name__: mod for mod in TargetConfigFactory.DEFAULT_MODULES}
+        module_by_name = {mod.__name__: mod for mod in TargetConfigFactory.ARCH_INDEX.load_default_modules()}
         # Sorting _here_ is a very important part of this configuration builder.
         # This makes sure that a config option defined in '20_xxx.py' has priority over '10_xxx.py'.
         for module_name in sorted(module_by_name.keys()):
@@ -67,9 +72,8 @@ class ConfigGenerator:
 
 # Instanciate the config generator and save in module scope.
 # Use this object in configure script when interacting with config.
+# The platform-independent modules are read on first access.
 config = ConfigGenerator()
-# walk platform-independent modules and read their values
-config.rebuild_default_config()
 
 
 def get_available_target_tree() -> 'dict[str, list[str]]':
@@ -78,25 +82,24 @@ def get_available_target_tree() -> 'dict[str, list[str]]':
         'arm64': ['generic_iso', 'raspberry_pi_cm4', 'raspberry_pi_3b'],
         'amd64': ['generic_iso'],
     }
+    The tree comes from the cached filesystem index, no target code is executed.
     """
     return {
-        mod.__name__: [
-            attribute for attribute in mod.__dict__.keys()
-            if not attribute.startswith('_')
-        ]
-        for mod in TargetConfigFactory.ARCH_MODULES
+        arch: list(targets)
+        for arch, targets in TargetConfigFactory.ARCH_INDEX.index['architectures'].items()
     }
 
 
 def load_architecture(arch: str, target: str) -> types.ModuleType:
-    """Load a given architecture and target combination by their names and apply their configuration. """
-    module_by_name = {mod.__name__: mod for mod in TargetConfigFactory.ARCH_MODULES}
-    assert arch in module_by_name, \
+    """Load a given architecture and target combination by their names and apply their configuration.
+    Only the selected target module (and the modules it imports itself) is executed. """
+    target_tree = get_available_target_tree()
+    assert arch in target_tree, \
         'Tried to load architecture \'{}\', but it the package cannot be found!'.format(arch)
-    assert hasattr(module_by_name[arch], target), \
-        'Configuration target not found for architecture \'{}\'. Please make sure the package has the ' \
-        'attribute \'{}\' defined in the architecture-module\'s __init__.py! '.format(arch, target)
-    target_module = getattr(module_by_name[arch], target)
+    assert target in target_tree[arch], \
+        'Configuration target not found for architecture \'{}\'. Please make sure the package has a ' \
+        'module \'{}.py\' in its architecture folder! '.format(arch, target)
+    target_module = TargetConfigFactory.ARCH_INDEX.load_target(arch, target)
     config.apply_module(target_module)
     return target_module
 
@@ -0,0 +1,259 @@
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: apt_pool.py
+# Purpose:
+#   A caching HTTP proxy for APT, shared by live-build (apt-http-proxy)
+#   and pbuilder-setup (--http-proxy), so the same packages are not downloaded
+#   again by every build.
+#   Files are kept by upstream URL below build/apt-pool/urls/, so every
+#   mirror, distribution and architecture has its own indices. Packages
+#   and other files that never change under the same name (pool/ and
+#   by-hash/) are served from the pool without asking the upstream;
+#   their contents are stored once in build/apt-pool/blobs/ and
+#   hardlinked to every URL they were downloaded from.
+#   Indices are revalidated with the upstream, and served from the pool
+#   when it cannot be reached, so a warm pool allows offline builds.
+
+
+import os
+import errno
+import shutil
+import hashlib
+import email.utils
+import tempfile
+import threading
+import http.server
+import urllib.error
+import urllib.parse
+import urllib.request
+
+BUFFER_SIZE = 1024 * 1024
+UPSTREAM_TIMEOUT = 60
+
+# Path components of files that never change once published
+IMMUTABLE_PATHS = ['/pool/', '/by-hash/']
+
+
+def is_immutable(url: str) -> bool:
+    path = urllib.parse.urlsplit(url).path
+    return any(p in path for p in IMMUTABLE_PATHS)
+
+
+class Pool:
+    """Files downloaded through the proxy and the statistics of a run. """
+    def __init__(self, pool_dir: str, offline: bool = False):
+        self.pool_dir = pool_dir
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0, 'stale': 0, 'errors': 0,
+                      'bytes_from_pool': 0, 'bytes_from_upstream': 0}
+        # don't send our own requests through a proxy from the environment
+        self.opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def url_path(self, url: str) -> str:
+        """Return the pool file of an upstream URL. """
+        parts = urllib.parse.urlsplit(url)
+        path = os.path.normpath('/' + urllib.parse.unquote(parts.path)).lstrip('/')
+        return os.path.join(self.pool_dir, 'urls', parts.netloc.replace(':', '_'), path)
+
+    def count(self, **counters) -> None:
+        with self.lock:
+            for name, value in counters.items():
+                self.stats[name] += value
+
+    def store(self, tmp: str, digest: str, path: str) -> None:
+        """Move a downloaded file into the pool, sharing the contents with
+        identical files downloaded from other URLs. """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        blob = os.path.join(self.pool_dir, 'blobs', digest[:2], digest)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if not os.path.exists(blob):
+            os.replace(tmp, blob)
+        else:
+            os.unlink(tmp)
+        tmp_link = path + '.tmp-{0}'.format(threading.get_ident())
+        os.link(blob, tmp_link)
+        os.replace(tmp_link, path)
+
+    def fetch(self, url: str, path: str, out) -> 'tuple[int, int]':
+        """Download url to the pool while writing it to out.
+
+        Returns the HTTP status and the number of bytes, 304 if the pool
+        file is up to date. Raises OSError if the upstream cannot be
+        reached and urllib.error.HTTPError for errors of the upstream. """
+        request = urllib.request.Request(url)
+        if os.path.exists(path):
+            mtime = os.path.getmtime(path)
+            request.add_header('If-Modified-Since', email.utils.formatdate(mtime, usegmt=True))
+        try:
+            response = self.opener.open(request, timeout=UPSTREAM_TIMEOUT)
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, 0
+            raise
+
+        with response:
+            out.begin(200, response.headers.get('Content-Length'))
+            digest = hashlib.sha256()
+            os.makedirs(os.path.join(self.pool_dir, 'tmp'), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.join(self.pool_dir, 'tmp'))
+            size = 0
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in iter(lambda: response.read(BUFFER_SIZE), b''):
+                        f.write(chunk)
+                        digest.update(chunk)
+                        out.write(chunk)
+                        size += len(chunk)
+                modified = response.headers.get('Last-Modified')
+                if modified:
+                    t = email.utils.parsedate_to_datetime(modified).timestamp()
+                    os.utime(tmp, (t, t))
+                self.store(tmp, digest.hexdigest(), path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.unlink(tmp)
+                raise
+        return 200, size
+
+    def summary(self) -> dict:
+        """Return the statistics of this run with the hit ratio. """
+        with self.lock:
+            stats = dict(self.stats)
+        served = stats['hits'] + stats['misses'] + stats['stale']
+        stats['hit_ratio'] = round((stats['hits'] + stats['stale']) / served, 4) if served else None
+        return stats
+
+
+class ProxyHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def begin(self, code: int, length: str = None) -> None:
+        self.started = True
+        self.send_response(code)
+        if length is not None:
+            self.send_header('Content-Length', length)
+        else:
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+
+    def write(self, data: bytes) -> None:
+        if self.command != 'HEAD':
+            self.wfile.write(data)
+
+    def send_file(self, path: str) -> int:
+        size = os.path.getsize(path)
+        self.begin(200, str(size))
+        if self.command != 'HEAD':
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile, BUFFER_SIZE)
+        return size
+
+    def do_GET(self):
+        pool = self.server.pool
+        url = self.path
+        if not url.startswith('http://'):
+            self.send_error(400, 'Only proxy requests for http:// URLs are supported')
+            return
+        path = pool.url_path(url)
+        pool.count(requests=1)
+        self.started = False
+
+        if os.path.isfile(path) and (pool.offline or is_immutable(url)):
+            pool.count(hits=1, bytes_from_pool=self.send_file(path))
+            return
+        if pool.offline:
+            pool.count(errors=1)
+            self.send_error(504, 'Not in the APT pool and working offline')
+            return
+
+        try:
+            code, size = pool.fetch(url, path, self)
+        except urllib.error.HTTPError as e:
+            pool.count(errors=1)
+            self.send_error(e.code, e.reason)
+            return
+        except OSError as e:
+            if self.started:
+                # failed halfway through, the client sees a short response
+                pool.count(errors=1)
+                self.close_connection = True
+            elif os.path.isfile(path):
+                # the upstream is unreachable, the last known index will do
+                pool.count(stale=1, bytes_from_pool=self.send_file(path))
+            else:
+                pool.count(errors=1)
+                self.send_error(502, 'Upstream unreachable: {0}'.format(e))
+            return
+        if code == 304:
+            pool.count(hits=1, bytes_from_pool=self.send_file(path))
+        else:
+            pool.count(misses=1, bytes_from_upstream=size)
+
+    do_HEAD = do_GET
+
+
+class Proxy:
+    """Runs the pool proxy in a background thread. """
+    def __init__(self, pool_dir: str, port: int, offline: bool = False, address: str = '127.0.0.1'):
+        self.pool = Pool(pool_dir, offline)
+        self.server = http.server.ThreadingHTTPServer((address, port), ProxyHandler)
+        self.server.daemon_threads = True
+        self.server.pool = self.pool
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> dict:
+        """Stop the proxy, returns the statistics of the run. """
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        return self.pool.summary()
+
+
+def start(pool_dir: str, port: int, offline: bool = False) -> Proxy:
+    """Start a proxy for the duration of a build. Returns None if another
+    one (e.g. scripts/apt-pool) is already listening on the port. """
+    try:
+        proxy = Proxy(pool_dir, port, offline)
+    except OSError as e:
+        if e.errno != errno.EADDRINUSE:
+            raise
+        print("I: Using the APT pool already running on port {0}".format(port))
+        return None
+    proxy.start()
+    return proxy
+
+
+def proxy_url(port: int) -> str:
+    return 'http://127.0.0.1:{0}'.format(port)
+
+
+def metrics(stats: dict) -> dict:
+    """Return the statistics of a run as timeline metrics. """
+    return {'apt_pool_' + name: value for name, value in stats.items() if value is not None}
+
+
+def format_summary(stats: dict) -> str:
+    return "{0} requests, {1} from the pool, {2} downloaded, hit ratio {3}, {4} MB saved".format(
+        stats['requests'], stats['hits'] + stats['stale'], stats['misses'],
+        '-' if stats['hit_ratio'] is None else '{0:.1%}'.format(stats['hit_ratio']),
+        stats['bytes_from_pool'] // 2**20)
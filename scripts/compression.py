@@ -0,0 +1,76 @@
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: compression.py
+# Purpose:
+#   Compression profiles of the squashfs filesystem, which makes up
+#   almost all of the ISO image.
+#   A profile is written as <type>[:<level>], e.g. 'xz', 'zstd:19' or
+#   'lz4', targets select one with the squashfs_compression option.
+
+
+# mksquashfs compressors with their level range (None: no levels) and
+# default level. mksquashfs compresses blocks on all CPUs with any of them.
+COMPRESSORS = {
+    'gzip': {'levels': (1, 9), 'level': 9},
+    'lzo': {'levels': (1, 9), 'level': 8},
+    'lz4': {'levels': None, 'level': None},
+    'xz': {'levels': None, 'level': None},
+    'zstd': {'levels': (1, 22), 'level': 15},
+}
+
+# Profiles compared by benchmark-compression if none are given
+BENCHMARK_PROFILES = ['xz', 'zstd:19', 'zstd:15', 'zstd:3', 'gzip', 'lz4']
+
+
+def parse_profile(spec: str) -> dict:
+    """Return the compressor and level of a profile. Raises ValueError
+    for an unknown compressor or level. """
+    compressor, _, level = spec.partition(':')
+    if compressor not in COMPRESSORS:
+        raise ValueError('Unknown squashfs compressor "{0}", use one of {1}'.format(
+                         compressor, ', '.join(sorted(COMPRESSORS))))
+    info = COMPRESSORS[compressor]
+    if level:
+        if info['levels'] is None:
+            raise ValueError('The {0} compressor has no compression levels'.format(compressor))
+        if not level.isdigit() or not info['levels'][0] <= int(level) <= info['levels'][1]:
+            raise ValueError('The {0} compression level must be between {1} and {2}'.format(
+                             compressor, *info['levels']))
+        level = int(level)
+    else:
+        level = info['level']
+
+    return {'name': spec, 'compressor': compressor, 'level': level}
+
+
+def is_valid(spec: str) -> bool:
+    try:
+        parse_profile(spec)
+    except ValueError:
+        return False
+    return True
+
+
+def compressor_options(profile: dict) -> list:
+    """Return the mksquashfs options of a profile besides the compressor,
+    live-build takes these from the MKSQUASHFS_OPTIONS environment variable. """
+    if profile['level'] is None:
+        return []
+    return ['-Xcompression-level', str(profile['level'])]
+
+
+def mksquashfs_arguments(profile: dict) -> list:
+    """Return the mksquashfs compression arguments of a profile. """
+    return ['-comp', profile['compressor']] + compressor_options(profile)
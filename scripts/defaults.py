@@ -24,8 +24,32 @@ BUILD_CONFIG = os.path.join(BUILD_DIR, 'build-config.json')
 PBUILDER_CONFIG = os.path.join(BUILD_DIR, 'pbuilderrc')
 PBUILDER_DIR = os.path.join(BUILD_DIR, 'pbuilder')
 
+# Kept outside the build dir so that 'make purge' does not remove them
+CACHE_HOME = os.environ.get('VYOS_BUILD_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'vyos-build'))
+PBUILDER_POOL_DIR = os.path.join(CACHE_HOME, 'pbuilder')
+CCACHE_DIR = os.path.join(CACHE_HOME, 'ccache')
+
 LB_CONFIG_DIR = os.path.join(BUILD_DIR, 'config')
 CHROOT_INCLUDES_DIR = os.path.join(LB_CONFIG_DIR, 'includes.chroot')
+LB_CONFIG_MANIFEST = os.path.join(BUILD_DIR, 'config-manifest.json')
+
+TARGET_INDEX_CACHE = os.path.join(BUILD_DIR, 'target-index.json')
+
+# Build directories of the targets of a batch build
+TARGETS_DIR = os.path.join(BUILD_DIR, 'targets')
+BATCH_CONFIG = os.path.join(BUILD_DIR, 'batch.json')
+
+STAGE_CACHE_DIR = os.path.join(BUILD_DIR, 'stage-cache')
+BUILD_TIMELINE = os.path.join(BUILD_DIR, 'build-timeline.json')
+
+# Caching APT proxy shared by live-build and pbuilder
+APT_POOL_DIR = os.path.join(BUILD_DIR, 'apt-pool')
+APT_POOL_PORT = 3142
+
+CONTROL_CACHE_DIR = os.path.join(BUILD_DIR, 'control-cache')
+
+PACKAGE_LOG_DIR = os.path.join(BUILD_DIR, 'package-logs')
+PACKAGE_CACHE_DIR = os.path.join(BUILD_DIR, 'package-cache')
 
 ARCHIVES_DIR = 'config/archives/'
 
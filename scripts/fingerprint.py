@@ -0,0 +1,142 @@
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: fingerprint.py
+# Purpose:
+#   Computes fingerprints of the build inputs, used to decide
+#   whether results of earlier builds can be reused.
+
+
+import os
+import json
+import hashlib
+
+# Config options that do not influence the contents of the bootstrap
+# and chroot stages (they only end up in the version files, ISO metadata
+# or the binary stage)
+VOLATILE_CONFIG_KEYS = [
+    'apt_pool_port',
+    'build_by',
+    'build_comment',
+    'build_dir',
+    'debug',
+    'incremental_config',
+    'list_all_targets',
+    'pbuilder_ccache',
+    'pbuilder_tmpfs',
+    'source_date_epoch',
+    'squashfs_compression',
+    'version',
+]
+
+# Config options that do not influence the image at all
+IMAGE_IGNORED_CONFIG_KEYS = [
+    'apt_pool_port',
+    'build_dir',
+    'debug',
+    'incremental_config',
+    'list_all_targets',
+    'pbuilder_ccache',
+    'pbuilder_tmpfs',
+]
+
+# Files in the live-build config dir that change with every build,
+# they are excluded from fingerprints and re-applied to restored stages
+VOLATILE_FILES = [
+    'includes.chroot/opt/vyatta/etc/version',
+    'includes.chroot/usr/lib/os-release',
+    'includes.chroot/usr/share/vyos/version.json',
+]
+
+# Config options that determine the debootstrap result
+BOOTSTRAP_CONFIG_KEYS = [
+    'build_architecture',
+    'debian_distribution',
+    'debian_mirror',
+]
+
+# Subdirectories of the live-build config dir that influence the chroot stage
+CHROOT_CONFIG_DIRS = [
+    'apt',
+    'archives',
+    'hooks',
+    'includes.chroot',
+    'package-lists',
+    'packages.chroot',
+    'preseed',
+]
+
+# lb config arguments are defined in here
+LB_CONFIG_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'BuildPreparation', 'live_build_config.py')
+
+
+def hash_config(build_config: dict, keys: list = None, exclude: list = VOLATILE_CONFIG_KEYS) -> str:
+    """Hash the given (or all non-volatile) config options. """
+    if keys is None:
+        keys = [k for k in build_config.keys() if k not in exclude]
+    data = {k: build_config.get(k) for k in sorted(keys)}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def update_tree_hash(digest, path: str, exclude: list = [], prefix: str = '') -> None:
+    """Feed relative names, modes and contents of all files below path into digest. """
+    if not os.path.isdir(path):
+        return
+    for root, dirs, files in os.walk(path):
+        dirs.sort()
+        for name in sorted(files):
+            file = os.path.join(root, name)
+            rel = os.path.normpath(os.path.join(prefix, os.path.relpath(file, path)))
+            if rel in exclude:
+                continue
+            digest.update(rel.encode() + b'\0')
+            digest.update(oct(os.stat(file).st_mode & 0o777).encode() + b'\0')
+            with open(file, 'rb') as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+            digest.update(b'\0')
+
+
+def stage_fingerprints(build_config: dict, lb_config_dir: str) -> 'dict[str, str]':
+    """Compute the fingerprints of the bootstrap and chroot stages.
+
+    A stage fingerprint covers everything its result depends on,
+    including the fingerprint of the previous stage. """
+    digest = hashlib.sha256()
+    digest.update(hash_config(build_config, keys=BOOTSTRAP_CONFIG_KEYS).encode())
+    with open(LB_CONFIG_SCRIPT, 'rb') as f:
+        digest.update(f.read())
+    bootstrap = digest.hexdigest()
+
+    digest = hashlib.sha256(bootstrap.encode())
+    digest.update(hash_config(build_config).encode())
+    volatile = [os.path.normpath(f) for f in VOLATILE_FILES]
+    for subdir in CHROOT_CONFIG_DIRS:
+        update_tree_hash(digest, os.path.join(lb_config_dir, subdir), exclude=volatile, prefix=subdir)
+    chroot = digest.hexdigest()
+
+    return {'bootstrap': bootstrap, 'chroot': chroot}
+
+
+def image_fingerprint(build_config: dict, lb_config_dir: str, chroot_fp: str) -> str:
+    """Compute the fingerprint of the image of a reproducible build.
+
+    It covers the chroot stage, all options and the whole live-build
+    config including the version files, so images with the same
+    fingerprint are identical. """
+    digest = hashlib.sha256(chroot_fp.encode())
+    digest.update(hash_config(build_config, exclude=IMAGE_IGNORED_CONFIG_KEYS).encode())
+    update_tree_hash(digest, lb_config_dir)
+    return digest.hexdigest()
@@ -0,0 +1,286 @@
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: hook_runner.py
+# Purpose:
+#   Runs live-build chroot hooks concurrently, in the order their headers
+#   declare. lb-build embeds this file together with the hooks in a single
+#   hook that live-build runs inside the chroot, so it must only use the
+#   standard library of the python3 in the image.
+#
+#   A hook declares what it needs in comment lines at its top:
+#
+#     # Hook-Depends: 17-gen_initramfs.chroot 30-*
+#     # Hook-Reads: /usr/share/initramfs-tools /lib/modules
+#     # Hook-Writes: /boot
+#
+#   Depends names hooks (glob patterns allowed) to run after, Writes
+#   lists the paths the hook changes, Reads the paths it uses which other
+#   hooks change. A hook runs after
+#     - the hooks it depends on,
+#     - all declared hooks writing a path it reads, whatever their names,
+#     - earlier (by name) hooks writing or reading a path it writes,
+#     - the nearest earlier hook without a header.
+#   A hook without any header keeps the serial order: it runs after all
+#   hooks sorted before it, and before all hooks sorted after it.
+#
+#   If measuring is enabled the hooks run one at a time and the size of
+#   the chroot is taken before and after each, the bytes it freed are
+#   added to its LB-HOOK-END marker.
+
+import os
+import re
+import sys
+import stat
+import base64
+import fnmatch
+import argparse
+import tempfile
+import subprocess
+import concurrent.futures
+
+HEADER = re.compile(r'^#\s*Hook-(Depends|Reads|Writes):(.*)$', re.I)
+HEADER_LINES = 40
+
+# Filled in with {hook name: base64 contents} when lb-build embeds this file
+HOOKS = {}
+JOBS = 1
+MEASURE = False
+
+# Not part of the image, live-build mounts them while hooks run
+UNMEASURED_PATHS = ['/proc', '/sys', '/dev', '/run']
+
+
+def parse_header(content: str) -> dict:
+    """Return the declared depends, reads and writes of a hook, None if
+    it has no header. """
+    header = None
+    for line in content.splitlines()[:HEADER_LINES]:
+        match = HEADER.match(line.strip())
+        if match:
+            if header is None:
+                header = {'depends': [], 'reads': [], 'writes': []}
+            header[match.group(1).lower()] += match.group(2).split()
+    return header
+
+
+def overlaps(paths: list, other: list) -> bool:
+    """True if a path of one list is equal to or below a path of the other. """
+    for a in paths:
+        for b in other:
+            a, b = a.rstrip('/') + '/', b.rstrip('/') + '/'
+            if a.startswith(b) or b.startswith(a):
+                return True
+    return False
+
+
+def plan(hooks: list) -> dict:
+    """Return the hooks each hook has to wait for.
+
+    hooks is a list of (name, header) in filename order. Raises ValueError
+    if the declarations contradict each other. """
+    names = [name for name, header in hooks]
+    headers = dict(hooks)
+    deps = {name: set() for name in names}
+
+    barrier = None
+    for i, (name, header) in enumerate(hooks):
+        if header is None:
+            deps[name].update(names[:i])
+            barrier = name
+            continue
+        if barrier:
+            deps[name].add(barrier)
+        for pattern in header['depends']:
+            matches = fnmatch.filter(names, pattern) or fnmatch.filter(names, pattern + '.chroot')
+            if not matches:
+                print("W: Hook {0} depends on {1}, which does not exist".format(name, pattern))
+            deps[name].update(m for m in matches if m != name)
+
+    declared = [name for name in names if headers[name] is not None]
+    for reader in declared:
+        for writer in declared:
+            if writer != reader and overlaps(headers[writer]['writes'], headers[reader]['reads']):
+                deps[reader].add(writer)
+    for i, first in enumerate(declared):
+        for second in declared[i + 1:]:
+            if first in deps[second] or second in deps[first]:
+                continue
+            if overlaps(headers[first]['writes'], headers[second]['writes'] + headers[second]['reads']) or \
+               overlaps(headers[first]['reads'], headers[second]['writes']):
+                deps[second].add(first)
+
+    topological_order(names, deps)
+    return deps
+
+
+def topological_order(names: list, deps: dict) -> list:
+    """Order names so every hook comes after its dependencies, preferring
+    filename order. Raises ValueError on a dependency cycle. """
+    order = []
+    done = set()
+    pending = list(names)
+    while pending:
+        ready = [name for name in pending if deps[name] <= done]
+        if not ready:
+            # follow unfinished dependencies until a hook repeats
+            cycle = [pending[0]]
+            while cycle.count(cycle[-1]) < 2:
+                cycle.append(sorted(deps[cycle[-1]] - done)[0])
+            cycle = cycle[cycle.index(cycle[-1]):]
+            raise ValueError('Hook dependency cycle: {0}'.format(' -> '.join(reversed(cycle))))
+        order.append(ready[0])
+        done.add(ready[0])
+        pending.remove(ready[0])
+    return order
+
+
+def tree_size(root: str = '/', skip: list = UNMEASURED_PATHS) -> int:
+    """Return the total size of the regular files below root, counting
+    hardlinked files once. """
+    size = 0
+    seen = set()
+    for path, dirs, files in os.walk(root):
+        dirs[:] = [d for d in dirs if os.path.join(path, d) not in skip]
+        for name in files:
+            try:
+                st = os.lstat(os.path.join(path, name))
+            except OSError:
+                continue
+            if stat.S_ISREG(st.st_mode) and (st.st_dev, st.st_ino) not in seen:
+                seen.add((st.st_dev, st.st_ino))
+                size += st.st_size
+    return size
+
+
+def run_hook(path: str, measure: bool = False) -> 'tuple[int, bytes, int]':
+    """Run a hook, returns its exit code, output and the bytes it freed,
+    None if not measured. """
+    before = tree_size() if measure else None
+    result = subprocess.run([path], cwd='/', stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    freed = before - tree_size() if measure else None
+    return result.returncode, result.stdout, freed
+
+
+def run(paths: dict, deps: dict, jobs: int, measure: bool = False) -> list:
+    """Run the hooks as soon as their dependencies finished, returns the
+    names of the failed hooks. No more hooks are started after a failure.
+
+    Every hook prints an LB-HOOK-BEGIN marker when it starts and its output
+    followed by an LB-HOOK-END marker when it finishes, so the output of
+    concurrent hooks is never interleaved. The size of the chroot can only
+    be attributed to a hook if no other one runs at the same time, so
+    measure runs them one at a time. """
+    if measure:
+        jobs = 1
+    out = sys.stdout.buffer
+    pending = sorted(paths)
+    running = {}
+    done = set()
+    failed = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            if not failed:
+                for name in [n for n in pending if deps[n] <= done]:
+                    if len(running) >= jobs:
+                        break
+                    pending.remove(name)
+                    out.write('LB-HOOK-BEGIN {0}\n'.format(name).encode())
+                    out.flush()
+                    running[pool.submit(run_hook, paths[name], measure)] = name
+            if not running:
+                break
+            finished, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in finished:
+                name = running.pop(future)
+                code, output, freed = future.result()
+                if jobs > 1:
+                    prefix = '[{0}] '.format(name).encode()
+                    output = b''.join(prefix + line for line in output.splitlines(True))
+                out.write(output)
+                if output and not output.endswith(b'\n'):
+                    out.write(b'\n')
+                if freed is None:
+                    out.write('LB-HOOK-END {0} {1}\n'.format(name, code).encode())
+                else:
+                    out.write('LB-HOOK-END {0} {1} {2}\n'.format(name, code, freed).encode())
+                out.flush()
+                if code:
+                    print("E: Hook {0} failed with exit code {1}".format(name, code), flush=True)
+                    failed.append(name)
+                else:
+                    done.add(name)
+    if failed and pending:
+        print("E: Hooks not run: {0}".format(' '.join(pending)), flush=True)
+    return failed
+
+
+def embed(hooks: dict, jobs: int, measure: bool = False) -> str:
+    """Return this file as a script that runs the given {name: contents}
+    hooks with up to jobs at once, measuring the bytes each one frees if
+    measure is set. """
+    with open(os.path.abspath(__file__), 'r') as f:
+        runner = f.read()
+    encoded = {name: base64.b64encode(content).decode() for name, content in hooks.items()}
+    runner = runner.replace('\nHOOKS = {}\n', '\nHOOKS = {0!r}\n'.format(encoded), 1)
+    runner = runner.replace('\nJOBS = 1\n', '\nJOBS = {0}\n'.format(jobs), 1)
+    runner = runner.replace('\nMEASURE = False\n', '\nMEASURE = {0!r}\n'.format(bool(measure)), 1)
+    return '#!/usr/bin/env python3\n' + runner
+
+
+def main(hooks: dict, jobs: int, measure: bool = False) -> int:
+    """Write the hooks to a temporary directory and run them. """
+    workdir = tempfile.mkdtemp(prefix='lb-hooks.')
+    paths = {}
+    entries = []
+    for name in sorted(hooks):
+        content = base64.b64decode(hooks[name])
+        paths[name] = os.path.join(workdir, name)
+        with open(paths[name], 'wb') as f:
+            f.write(content)
+        os.chmod(paths[name], 0o755)
+        entries.append((name, parse_header(content.decode(errors='replace'))))
+    try:
+        deps = plan(entries)
+        return 1 if run(paths, deps, jobs, measure) else 0
+    finally:
+        for path in paths.values():
+            os.unlink(path)
+        os.rmdir(workdir)
+
+
+if __name__ == '__main__':
+    if HOOKS:
+        sys.exit(main(HOOKS, JOBS, MEASURE))
+
+    parser = argparse.ArgumentParser(description='Show the order live-build chroot hooks run in.')
+    parser.add_argument('hooks_dir', help='Directory of hooks, e.g. data/live-build-config/hooks/live')
+    args = parser.parse_args()
+
+    entries = []
+    for name in sorted(os.listdir(args.hooks_dir)):
+        if name.endswith('.chroot'):
+            with open(os.path.join(args.hooks_dir, name), 'r', errors='replace') as f:
+                entries.append((name, parse_header(f.read())))
+    try:
+        deps = plan(entries)
+    except ValueError as e:
+        print("E: {0}".format(e))
+        sys.exit(1)
+    headers = dict(entries)
+    for name in topological_order([n for n, h in entries], deps):
+        if headers[name] is None:
+            print("{0:45} serial    after all earlier hooks".format(name))
+        else:
+            print("{0:45} declared  after: {1}".format(name, ' '.join(sorted(deps[name])) or '-'))
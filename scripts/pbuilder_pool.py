@@ -0,0 +1,96 @@
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: pbuilder_pool.py
+# Purpose:
+#   Base chroots of pbuilder kept outside the build directory, one per
+#   distribution, architecture and mirror, so pbuilder-setup only has to
+#   update an existing one, and the ccache shared by all pbuilder builds.
+
+
+import os
+import json
+import time
+import hashlib
+import subprocess
+
+import defaults
+
+# Where pbuilder unpacks the base chroot for a build if pbuilder_tmpfs is set
+TMPFS_BUILDPLACE = '/dev/shm/vyos-pbuilder'
+
+
+def base_key(build_config: dict) -> str:
+    mirror = hashlib.sha256(build_config['pbuilder_debian_mirror'].encode()).hexdigest()[:12]
+    return '{0}-{1}-{2}'.format(build_config['debian_distribution'], build_config['build_architecture'], mirror)
+
+
+def base_path(build_config: dict) -> str:
+    return os.path.join(defaults.PBUILDER_POOL_DIR, 'base-{0}.tgz'.format(base_key(build_config)))
+
+
+def record(build_config: dict, action: str, duration: float) -> None:
+    """Note when and how a base chroot was last created or updated. """
+    info_file = base_path(build_config) + '.json'
+    info = {}
+    if os.path.exists(info_file):
+        with open(info_file, 'r') as f:
+            info = json.load(f)
+    info.update({
+        'distribution': build_config['debian_distribution'],
+        'architecture': build_config['build_architecture'],
+        'mirror': build_config['pbuilder_debian_mirror'],
+        'last_' + action: int(time.time()),
+        'last_{0}_seconds'.format(action): round(duration, 1),
+    })
+    info[action + 's'] = info.get(action + 's', 0) + 1
+    with open(info_file, 'w') as f:
+        json.dump(info, f, indent=2)
+
+
+def entries() -> list:
+    """Return the info of all base chroots in the pool with their size. """
+    result = []
+    if not os.path.isdir(defaults.PBUILDER_POOL_DIR):
+        return result
+    for name in sorted(os.listdir(defaults.PBUILDER_POOL_DIR)):
+        if not name.endswith('.tgz'):
+            continue
+        path = os.path.join(defaults.PBUILDER_POOL_DIR, name)
+        info = {}
+        if os.path.exists(path + '.json'):
+            with open(path + '.json', 'r') as f:
+                info = json.load(f)
+        info.update({'file': path, 'size': os.path.getsize(path)})
+        result.append(info)
+    return result
+
+
+def ccache_stats() -> dict:
+    """Return the hit and miss counts of the shared ccache, None if ccache
+    is not installed on the host or has no statistics yet. """
+    env = dict(os.environ, CCACHE_DIR=defaults.CCACHE_DIR)
+    try:
+        output = subprocess.check_output(['ccache', '--print-stats'], env=env, stderr=subprocess.DEVNULL)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    counters = {}
+    for line in output.decode().splitlines():
+        name, _, value = line.partition('\t')
+        if value.strip().isdigit():
+            counters[name] = int(value)
+    hits = counters.get('direct_cache_hit', 0) + counters.get('preprocessed_cache_hit', 0)
+    misses = counters.get('cache_miss', 0)
+    return {'hits': hits, 'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None}
@@ -0,0 +1,145 @@
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: timing.py
+# Purpose:
+#   Records the duration of named phases with a monotonic clock and
+#   compares the phases of two JSON reports to find regressions.
+#   A report is any JSON object with a 'phases' list of
+#   {'name': ..., 'start': ..., 'duration': ..., 'result': ...} entries,
+#   'start' being seconds since the beginning of the run, and optionally
+#   a 'metrics' object of other numbers to compare, e.g. disk usage.
+
+
+import json
+import time
+import threading
+import contextlib
+
+
+class Timeline(object):
+    def __init__(self):
+        self.started = time.time()
+        self.__start = time.monotonic()
+        self.__lock = threading.Lock()
+        self.phases = []
+
+    def add(self, name: str, start: float, duration: float, result: str = 'ok', **info) -> dict:
+        """Record a phase measured by the caller, start is a time.monotonic() value. """
+        phase = {'name': name, 'start': round(start - self.__start, 3),
+                 'duration': round(duration, 3), 'result': result}
+        phase.update(info)
+        with self.__lock:
+            self.phases.append(phase)
+        return phase
+
+    @contextlib.contextmanager
+    def phase(self, name: str, **info):
+        """Time the enclosed block, the phase result is 'error' if it raises. """
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException:
+            self.add(name, start, time.monotonic() - start, result='error', **info)
+            raise
+        self.add(name, start, time.monotonic() - start, **info)
+
+    def to_dict(self) -> dict:
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S%z', time.localtime(self.started)),
+            'total': round(time.monotonic() - self.__start, 3),
+            'phases': sorted(self.phases, key=lambda p: p['start']),
+        }
+
+
+def load_report(path: str) -> dict:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def phase_durations(report: dict) -> 'dict[str, float]':
+    """Return the duration of every phase by name. Phases recorded more than
+    once (e.g. the boot of every VM of a parallel run) count with the
+    slowest occurrence. """
+    durations = {}
+    for phase in report.get('phases', []):
+        durations[phase['name']] = max(durations.get(phase['name'], 0.0), phase['duration'])
+    return durations
+
+
+def compare(old: dict, new: dict, threshold: float = 10.0, min_delta: float = 1.0) -> list:
+    """Compare the phases of two reports.
+
+    Returns (name, old duration, new duration, regression) tuples for all
+    phases, regression is True if a phase got slower by more than threshold
+    percent and more than min_delta seconds. Phases only present in one of
+    the reports have None as their other duration. """
+    old_durations = phase_durations(old)
+    new_durations = phase_durations(new)
+    result = []
+    for name in sorted(set(old_durations) | set(new_durations)):
+        before = old_durations.get(name)
+        after = new_durations.get(name)
+        regression = before is not None and after is not None and \
+            after - before > min_delta and after > before * (1 + threshold / 100)
+        result.append((name, before, after, regression))
+    return result
+
+
+def compare_metrics(old: dict, new: dict) -> list:
+    """Return (name, old value, new value) of the metrics of two reports. """
+    old_metrics = old.get('metrics', {})
+    new_metrics = new.get('metrics', {})
+    return [(name, old_metrics.get(name), new_metrics.get(name))
+            for name in sorted(set(old_metrics) | set(new_metrics))]
+
+
+def percentile(values: list, p: float) -> float:
+    """Return the p-th percentile of values, interpolated linearly between
+    the closest ranks. """
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+
+def summarize(values: list) -> dict:
+    """Return the count, mean and percentiles of repeated measurements,
+    None if there are none. """
+    if not values:
+        return None
+    result = {'count': len(values), 'mean': round(sum(values) / len(values), 3),
+              'min': round(min(values), 3), 'max': round(max(values), 3)}
+    for p in [50, 90, 95]:
+        result['p{0}'.format(p)] = round(percentile(values, p), 3)
+    return result
+
+
+def print_comparison(comparison: list, only_changes: bool = False) -> None:
+    def fmt(value):
+        return '{0:10.1f}'.format(value) if value is not None else '{0:>10}'.format('-')
+
+    print('{0:60} {1:>10} {2:>10} {3:>8}'.format('phase', 'old [s]', 'new [s]', 'change'))
+    for name, before, after, regression in comparison:
+        if before is None or after is None:
+            change = '{0:>8}'.format('new' if before is None else 'gone')
+        elif before > 0:
+            change = '{0:+7.1f}%'.format((after - before) / before * 100)
+        else:
+            change = '{0:>8}'.format('')
+        if only_changes and not regression and before is not None and after is not None:
+            continue
+        print('{0:60} {1} {2} {3}{4}'.format(name[-60:], fmt(before), fmt(after), change,
+                                             '  REGRESSION' if regression else ''))
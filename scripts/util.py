@@ -19,34 +19,240 @@
 
 import sys
 import os
+import glob
+import shutil
+import hashlib
 from distutils.spawn import find_executable
 
 import defaults
 
-def check_build_config():
-    if not os.path.exists(defaults.BUILD_CONFIG):
-        print("Build config file ({file}) does not exist".format(file=defaults.BUILD_CONFIG))
+def check_build_config(path=defaults.BUILD_CONFIG):
+    if not os.path.exists(path):
+        print("Build config file ({file}) does not exist".format(file=path))
         print("If you are running this script by hand, you should better not. Run 'make iso' instead.")
         sys.exit(1)
 
 
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Return the hex SHA-256 digest of a file, read in large chunks. """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def reflink(src: str, dst: str) -> bool:
+    """Try to create dst as a copy-on-write clone of src (btrfs, xfs...).
+    Returns False if the filesystem does not support it. """
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    FICLONE = 0x40049409
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+    except OSError:
+        if os.path.exists(dst):
+            os.unlink(dst)
+        return False
+    shutil.copystat(src, dst)
+    return True
+
+
+def link_or_copy(src: str, dst: str) -> str:
+    """Place src at dst without duplicating its data if possible.
+    Tries a reflink first, then a hardlink, and falls back to a plain copy.
+    Returns the method that was used ('reflink', 'hardlink' or 'copy').
+
+    dst must not exist, otherwise a hardlinked target would be
+    overwritten in place together with its source. """
+    if reflink(src, dst):
+        return 'reflink'
+    try:
+        os.link(src, dst)
+        return 'hardlink'
+    except OSError:
+        shutil.copy2(src, dst)
+        return 'copy'
+
+
+def parse_size(size: str) -> int:
+    """Convert a size like '512M' or '10G' to bytes. """
+    units = {'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+    size = str(size).strip().upper().rstrip('B')
+    if size and size[-1] in units:
+        return int(float(size[:-1]) * units[size[-1]])
+    return int(size)
+
+
+def evict_lru(directory: str, max_bytes: int, pattern: str = '*', keep: list = []) -> list:
+    """Remove the least recently used entries matching pattern from directory
+    until their total size fits into max_bytes. Entries are files or directories,
+    their mtime is the last use, so users of a cache should touch what they reuse.
+    Returns the removed paths. """
+    def entry_size(path):
+        if not os.path.isdir(path):
+            return os.path.getsize(path)
+        return sum(os.path.getsize(os.path.join(root, f))
+                   for root, dirs, files in os.walk(path) for f in files)
+
+    entries = sorted(glob.glob(os.path.join(directory, pattern)), key=os.path.getmtime)
+    sizes = {e: entry_size(e) for e in entries}
+    total = sum(sizes.values())
+    keep = [os.path.abspath(k) for k in keep]
+    removed = []
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        if os.path.abspath(entry) in keep:
+            continue
+        if os.path.isdir(entry):
+            shutil.rmtree(entry)
+        else:
+            os.unlink(entry)
+        total -= sizes[entry]
+        removed.append(entry)
+    return removed
+
+
+DPKG_STATUS_FILE = '/var/lib/dpkg/status'
+
+
+def read_dpkg_status(status_file: str = DPKG_STATUS_FILE) -> 'dict[str, str]':
+    """Return the versions of all installed packages, read in one pass
+    from the dpkg status database. """
+    installed = {}
+    try:
+        with open(status_file, 'r', encoding='utf-8', errors='replace') as f:
+            data = f.read()
+    except OSError:
+        return installed
+
+    for paragraph in data.split('\n\n'):
+        fields = {}
+        for line in paragraph.splitlines():
+            if line and not line[0].isspace() and ':' in line:
+                key, value = line.split(':', 1)
+                fields[key] = value.strip()
+        if 'Package' in fields and fields.get('Status', '').endswith('ok installed'):
+            installed[fields['Package']] = fields.get('Version', '')
+    return installed
+
+
+def _version_order(c: str) -> int:
+    if c.isdigit():
+        return 0
+    if c.isascii() and c.isalpha():
+        return ord(c)
+    if c == '~':
+        return -1
+    if c:
+        return ord(c) + 256
+    return 0
+
+
+def _verrevcmp(a: str, b: str) -> int:
+    """Compare upstream versions or revisions the way dpkg does. """
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ac = _version_order(a[i] if i < len(a) else '')
+            bc = _version_order(b[j] if j < len(b) else '')
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == '0':
+            i += 1
+        while j < len(b) and b[j] == '0':
+            j += 1
+        first_diff = 0
+        while i < len(a) and a[i].isdigit() and j < len(b) and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+def compare_versions(a: str, b: str) -> int:
+    """Compare two Debian package versions, returns <0, 0 or >0 like cmp(). """
+    def split(version):
+        # the epoch ends at the first colon, the upstream version may contain more
+        epoch, _, rest = version.partition(':') if ':' in version else ('0', '', version)
+        upstream, _, revision = rest.rpartition('-') if '-' in rest else (rest, '', '')
+        return int(epoch or 0), upstream, revision
+
+    a_epoch, a_upstream, a_revision = split(a)
+    b_epoch, b_upstream, b_revision = split(b)
+    if a_epoch != b_epoch:
+        return a_epoch - b_epoch
+    return _verrevcmp(a_upstream, b_upstream) or _verrevcmp(a_revision, b_revision)
+
+
+# Debian relation operators (plus the deprecated '<' and '>' meaning '<=' and '>=')
+VERSION_RELATIONS = {
+    '<<': lambda c: c < 0,
+    '<=': lambda c: c <= 0,
+    '=': lambda c: c == 0,
+    '>=': lambda c: c >= 0,
+    '>>': lambda c: c > 0,
+    '<': lambda c: c <= 0,
+    '>': lambda c: c >= 0,
+}
+
+
+def parse_dependency(dependency: str) -> tuple:
+    """Split a dependency like 'live-build (>= 1:20210407)'
+    into its name, relation and version. """
+    name, _, constraint = dependency.partition('(')
+    if not constraint:
+        return name.strip(), None, None
+    constraint = constraint.rstrip(') ')
+    for relation in sorted(VERSION_RELATIONS, key=len, reverse=True):
+        if constraint.startswith(relation):
+            return name.strip(), relation, constraint[len(relation):].strip()
+    raise ValueError("Invalid version constraint in dependency '{0}'".format(dependency))
+
+
 class DependencyChecker(object):
-    def __init__(self, spec):
-        missing_packages = self._get_missing_packages(spec['packages'])
+    """Checks that packages (optionally with version constraints,
+    e.g. 'live-build (>= 1:20210407)') and binaries are installed.
+    All packages are resolved from a single read of the dpkg status database. """
+    def __init__(self, spec, status_file=DPKG_STATUS_FILE):
+        self.__package_results = self._check_packages(spec['packages'], read_dpkg_status(status_file))
+        missing_packages = [r['dependency'] for r in self.__package_results if not r['satisfied']]
         missing_binaries = self._get_missing_binaries(spec['binaries'])
         self.__missing = {'packages': missing_packages, 'binaries': missing_binaries}
 
-
-    def _package_installed(self, name):
-        result = os.system("dpkg-query -W --showformat='${{Status}}\n' {name} 2>&1 | grep 'install ok installed' >/dev/null".format(name=name))
-        return True if result == 0 else False
-
-    def _get_missing_packages(self, packages):
-        missing_packages = []
-        for p in packages:
-            if not self._package_installed(p):
-                missing_packages.append(p)
-        return missing_packages
+    def _check_packages(self, packages, installed):
+        results = []
+        for dependency in packages:
+            name, relation, version = parse_dependency(dependency)
+            installed_version = installed.get(name)
+            if installed_version is None:
+                satisfied = False
+            elif relation is None:
+                satisfied = True
+            else:
+                satisfied = VERSION_RELATIONS[relation](compare_versions(installed_version, version))
+            results.append({
+                'dependency': dependency,
+                'name': name,
+                'relation': relation,
+                'version': version,
+                'installed_version': installed_version,
+                'satisfied': satisfied,
+            })
+        return results
 
     def _get_missing_binaries(self, binaries):
         missing_binaries = []
@@ -55,6 +261,10 @@ class DependencyChecker(object):
                 missing_binaries.append(b)
         return missing_binaries
 
+    def get_package_results(self):
+        """Return one dict per checked package with the requested and installed version. """
+        return self.__package_results
+
     def get_missing_dependencies(self):
         if self.__missing['packages'] or self.__missing['binaries']:
             return self.__missing
@@ -62,4 +272,7 @@ class DependencyChecker(object):
 
     def print_missing_deps(self):
         print("Missing packages: " + " ".join(self.__missing['packages']))
+        for r in self.__package_results:
+            if not r['satisfied'] and r['installed_version'] is not None:
+                print("  {0} is installed in version {1}".format(r['name'], r['installed_version']))
         print("Missing binaries: " + " ".join(self.__missing['binaries']))
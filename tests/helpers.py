@@ -0,0 +1,36 @@
+#
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: helpers.py
+# Purpose:
+#   Makes the modules and scripts of scripts/ importable by the tests.
+
+import os
+import sys
+import importlib.util
+import importlib.machinery
+
+ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+SCRIPTS_DIR = os.path.join(ROOT_DIR, 'scripts')
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+def load_script(name):
+    """ Import an extensionless script of scripts/ as a module """
+    loader = importlib.machinery.SourceFileLoader(name.replace('-', '_'), os.path.join(SCRIPTS_DIR, name))
+    spec = importlib.util.spec_from_loader(loader.name, loader)
+    module = importlib.util.module_from_spec(spec)
+    loader.exec_module(module)
+    return module
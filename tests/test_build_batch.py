@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: test_build_batch.py
+# Purpose:
+#   Unit tests of the choice of the shared chroot in scripts/build-batch,
+#   with the configs of the amd64 generic_iso and vep1400 targets and a
+#   custom target adding a hook to generic_iso.
+#   Run with: python3 -m unittest discover tests
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import contextlib
+
+from helpers import ROOT_DIR, load_script
+
+import TargetConfigFactory.helper as target_helper
+from BuildPreparation import initramfs_config
+
+build_batch = load_script('build-batch')
+
+
+class PlanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # the target hooks work relative to the repository
+        os.symlink(os.path.join(ROOT_DIR, 'data'), os.path.join(self.tmp.name, 'data'))
+        self.cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    def configure(self, target, epoch, name=None, hooks=()):
+        """ Write the config of target like a batch build-config run, with
+        the files of lb config reduced to the SOURCE_DATE_EPOCH it records.
+        name and hooks configure a custom target adding chroot hooks """
+        target_helper.config.rebuild_default_config()
+        module = target_helper.load_architecture('amd64', target)
+        config = target_helper.config.to_dict()
+        config['build_target'] = name or target
+        config['build_dir'] = 'build'
+
+        for directory in ['hooks/live', 'includes.chroot', 'package-lists']:
+            os.makedirs(os.path.join('build', 'config', directory))
+        with open(os.path.join('build', 'config', 'common'), 'w') as f:
+            f.write('LB_MODE="debian"\nSOURCE_DATE_EPOCH="{0}"\n'.format(epoch))
+        with contextlib.redirect_stdout(io.StringIO()):
+            initramfs_config.write(config)
+            module._configure_hook(config)
+        for hook in hooks:
+            with open(os.path.join('build', 'config', 'hooks', 'live', hook), 'w') as f:
+                f.write('#!/bin/sh\ntrue\n')
+
+        target_dir = os.path.join('targets', name or target)
+        os.makedirs('targets', exist_ok=True)
+        shutil.move('build', target_dir)
+        config['build_dir'] = target_dir
+        return {'config': config, 'files': build_batch.tree_digests(os.path.join(target_dir, 'config'))}
+
+    def initramfs_inputs(self, target):
+        return {name: digest for name, digest in target['files'].items()
+                if name.startswith(build_batch.INITRAMFS_CONFIG)}
+
+    def test_derived_configured_at_another_time(self):
+        targets = {'generic_iso': self.configure('generic_iso', 1700000000),
+                   'custom': self.configure('generic_iso', 1700000042, 'custom', ['95-custom.chroot'])}
+        base, derived = build_batch.plan(targets)
+        self.assertEqual(base, 'generic_iso')
+        self.assertEqual(derived, {'custom': ['hooks/live/95-custom.chroot']})
+
+    def test_initramfs_of_derived_targets(self):
+        targets = {'generic_iso': self.configure('generic_iso', 1700000000),
+                   'custom': self.configure('generic_iso', 1700000000, 'custom', ['95-custom.chroot']),
+                   'vep1400': self.configure('vep1400', 1700000000)}
+        base, derived = build_batch.plan(targets)
+        self.assertEqual(base, 'generic_iso')
+        # the VEP initramfs profile needs a chroot of its own
+        self.assertEqual(list(derived), ['custom'])
+        # a copy of the base chroot has the initramfs a full build of the
+        # derived target generates
+        for name in derived:
+            self.assertEqual(self.initramfs_inputs(targets[name]), self.initramfs_inputs(targets[base]))
+        self.assertNotEqual(self.initramfs_inputs(targets['vep1400']), self.initramfs_inputs(targets[base]))
+
+    def test_changed_lb_option(self):
+        targets = {'generic_iso': self.configure('generic_iso', 1700000000),
+                   'custom': self.configure('generic_iso', 1700000000, 'custom', ['95-custom.chroot'])}
+        with open(os.path.join('targets', 'custom', 'config', 'common'), 'a') as f:
+            f.write('LB_ARCHIVE_AREAS="main contrib"\n')
+        targets['custom']['files'] = build_batch.tree_digests(os.path.join('targets', 'custom', 'config'))
+        self.assertEqual(build_batch.plan(targets), (None, {}))
+
+if __name__ == '__main__':
+    unittest.main()
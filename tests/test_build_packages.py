@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: test_build_packages.py
+# Purpose:
+#   Unit tests of the package cache and cache keys of scripts/build-packages.
+#   Run with: python3 -m unittest discover tests
+
+import os
+import tempfile
+import unittest
+
+from helpers import load_script
+
+build_packages = load_script('build-packages')
+
+
+class PackageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = build_packages.PackageCache(os.path.join(self.tmp.name, 'cache'), 1 << 30)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_uncacheable_package(self):
+        # a package whose dependency has no key has no key either
+        package = build_packages.Package('foo', os.path.join(self.tmp.name, 'foo'), 'true')
+        package.deps = {'bar'}
+        key = package.compute_key({'bar': None}, {})
+        self.assertIsNone(key)
+        self.assertIsNone(self.cache.lookup(key))
+
+    def test_lookup_saved(self):
+        deb = os.path.join(self.tmp.name, 'foo_1.0_amd64.deb')
+        with open(deb, 'w') as f:
+            f.write('deb')
+        self.assertIsNone(self.cache.lookup('abc'))
+        self.cache.save('abc', 'foo', [deb])
+        self.assertEqual(self.cache.lookup('abc'), os.path.join(self.cache.cache_dir, 'abc'))
+
+
+class CacheKeyTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def packages(self, lib_commit):
+        """ Jenkinsfile entries app, depending on lib """
+        lib = build_packages.Package('lib/lib', os.path.join(self.tmp.name, 'lib', 'lib'), 'make',
+                                     source=('https://example.com/lib.git', lib_commit))
+        app = build_packages.Package('app/app', os.path.join(self.tmp.name, 'app', 'app'), 'make',
+                                     source=('https://example.com/app.git', 'a1'))
+        app.deps = {'lib/lib'}
+        return {'lib/lib': lib, 'app/app': app}
+
+    def key(self, lib_commit):
+        packages = self.packages(lib_commit)
+        selected = {'app/app': packages['app/app']}
+        keys = build_packages.compute_keys(packages, {}, selected)
+        build_packages.restrict(packages, selected)
+        return keys['app/app']
+
+    def test_unselected_dependency_changes_key(self):
+        self.assertIsNotNone(self.key('c1'))
+        self.assertEqual(self.key('c1'), self.key('c1'))
+        self.assertNotEqual(self.key('c1'), self.key('c2'))
+
+
+if __name__ == '__main__':
+    unittest.main()
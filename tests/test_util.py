@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+#
+# Copyright (C) 2021 VyOS maintainers and contributors
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License version 2 or later as
+# published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# File: test_util.py
+# Purpose:
+#   Unit tests of the Debian version comparison in scripts/util.py.
+#   Run with: python3 -m unittest discover tests
+
+import unittest
+
+import helpers  # noqa: F401, puts scripts/ on sys.path
+import util
+
+
+class CompareVersionsTest(unittest.TestCase):
+    def test_order(self):
+        self.assertLess(util.compare_versions('1.0-1', '1.0-2'), 0)
+        self.assertLess(util.compare_versions('1.0~rc1', '1.0'), 0)
+        self.assertGreater(util.compare_versions('1:0.9', '2.0'), 0)
+        self.assertEqual(util.compare_versions('0:1.0', '1.0'), 0)
+
+    def test_colon_in_upstream_version(self):
+        self.assertLess(util.compare_versions('1:2.3:4-1', '1:2.3:4-2'), 0)
+        self.assertGreater(util.compare_versions('1:2.3:5', '1:2.3:4'), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,31 +1,225 @@
 #!/usr/bin/env python3
+#
+# Downloads the latest rolling release ISO.
+#
+# The file is fetched in HTTP Range segments over a pooled session and
+# written into a preallocated <name>.part file, the finished segments
+# are recorded in <name>.part.json so an interrupted download resumes
+# where it stopped. The ISO is only renamed into place after its sha256
+# checksum and minisign signature have been verified.
 
 import os
 import sys
+import json
+import hashlib
+import argparse
+import threading
+import subprocess
+import concurrent.futures
 from lxml import html
 from urllib.parse import unquote
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 BASE_URL = 'https://downloads.vyos.io/'
 PAGE_URL = BASE_URL+'?dir=rolling/current/amd64'
 
+PUBLIC_KEY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', 'live-build-config',
+                          'includes.chroot', 'usr', 'share', 'vyos', 'keys', 'vyos-release.minisign.pub')
 
-def download():
-    page = requests.get(PAGE_URL)
+BUFFER_SIZE = 1024 * 1024
+SEGMENT_RETRIES = 3
+
+
+def get_session(jobs):
+    retries = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(pool_maxsize=jobs, max_retries=retries))
+    session.mount('http://', HTTPAdapter(pool_maxsize=jobs, max_retries=retries))
+    return session
+
+
+def find_latest_iso(session):
+    page = session.get(PAGE_URL)
+    page.raise_for_status()
     tree = html.fromstring(page.content)
     path = '//*[@id="directory-listing"]/li/a[1]/@href'
     isos = [x for x in tree.xpath(path) if os.path.splitext(x)[1] == '.iso']
-    latest_iso_url = os.path.join(BASE_URL, isos[-1])
-    filename = unquote(os.path.basename(latest_iso_url))
+    return os.path.join(BASE_URL, isos[-1])
+
+
+def fetch_text(session, url):
+    """ Return the contents of a small file, None if it does not exist """
+    r = session.get(url, timeout=60)
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.text
+
+
+class SegmentedDownload(object):
+    def __init__(self, session, url, filename, jobs, segment_size):
+        self.session = session
+        self.url = url
+        self.part_file = filename + '.part'
+        self.state_file = filename + '.part.json'
+        self.jobs = jobs
+        self.segment_size = segment_size
+        self.lock = threading.Lock()
+
+    def load_state(self, size, etag):
+        """ Return the finished segments of an earlier attempt at the same file """
+        try:
+            with open(self.state_file, 'r') as f:
+                state = json.load(f)
+            if os.path.getsize(self.part_file) == size and \
+               (state['url'], state['size'], state['etag'], state['segment_size']) == \
+               (self.url, size, etag, self.segment_size):
+                return state
+        except (OSError, ValueError, KeyError):
+            pass
+        return {'url': self.url, 'size': size, 'etag': etag, 'segment_size': self.segment_size, 'done': []}
+
+    def save_state(self):
+        with open(self.state_file + '.tmp', 'w') as f:
+            json.dump(self.state, f)
+        os.replace(self.state_file + '.tmp', self.state_file)
+
+    def fetch_segment(self, fd, index, start, end):
+        for attempt in range(SEGMENT_RETRIES):
+            try:
+                headers = {'Range': 'bytes={0}-{1}'.format(start, end)} if end >= 0 else {}
+                with self.session.get(self.url, headers=headers, stream=True, timeout=60) as r:
+                    r.raise_for_status()
+                    if end >= 0 and r.status_code != 206:
+                        raise IOError('Server ignored the Range request')
+                    offset = start
+                    for chunk in r.iter_content(chunk_size=BUFFER_SIZE):
+                        offset += os.pwrite(fd, chunk, offset)
+                if end >= 0 and offset != end + 1:
+                    raise IOError('Segment {0} is incomplete'.format(index))
+                break
+            except (IOError, requests.RequestException) as e:
+                if attempt == SEGMENT_RETRIES - 1:
+                    raise
+                print("W: Retrying segment {0}: {1}".format(index, e))
+        with self.lock:
+            self.state['done'].append(index)
+            self.save_state()
+        return offset
+
+    def run(self):
+        head = self.session.head(self.url, allow_redirects=True, timeout=60)
+        head.raise_for_status()
+        size = int(head.headers.get('Content-Length', -1))
+        ranges = head.headers.get('Accept-Ranges') == 'bytes' and size > 0
+        self.state = self.load_state(size, head.headers.get('ETag'))
+
+        if ranges:
+            segments = [(i, start, min(start + self.segment_size, size) - 1)
+                        for i, start in enumerate(range(0, size, self.segment_size))]
+        else:
+            # no Range support, fetch everything in one stream
+            segments = [(0, 0, -1)]
+            self.state['done'] = []
+        todo = [s for s in segments if s[0] not in self.state['done']]
+        if len(todo) < len(segments):
+            print("I: Resuming download, {0} of {1} segments left".format(len(todo), len(segments)))
+
+        fd = os.open(self.part_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if ranges and len(todo) == len(segments):
+                os.ftruncate(fd, 0)
+                try:
+                    os.posix_fallocate(fd, 0, size)
+                except OSError:
+                    os.ftruncate(fd, size)
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                futures = [pool.submit(self.fetch_segment, fd, *segment) for segment in todo]
+                for future in concurrent.futures.as_completed(futures):
+                    written = future.result()
+            if not ranges:
+                os.ftruncate(fd, written)
+        finally:
+            os.close(fd)
+
+
+def sha256_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(BUFFER_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify(session, url, part_file, filename, args):
+    """ Check the downloaded file against the published checksum and signature """
+    checksum = sha256_file(part_file)
+    expected = args.sha256
+    if not expected:
+        published = fetch_text(session, url + '.sha256')
+        if published:
+            expected = published.split()[0]
+    if expected:
+        if checksum != expected.lower():
+            print("E: sha256 mismatch: expected {0}, got {1}".format(expected, checksum))
+            return False
+        print("I: sha256 verified: {0}".format(checksum))
+    else:
+        print("W: No published sha256 checksum, sha256 is {0}".format(checksum))
+
+    signature = fetch_text(session, url + '.minisig')
+    if signature is None:
+        print("W: No published minisign signature")
+        return not args.require_signature
+    with open(filename + '.minisig', 'w') as f:
+        f.write(signature)
+    try:
+        result = subprocess.call(['minisign', '-V', '-q', '-p', args.public_key,
+                                  '-m', part_file, '-x', filename + '.minisig'])
+    except FileNotFoundError:
+        print("W: minisign is not installed, signature not verified")
+        return not args.require_signature
+    if result != 0:
+        print("E: minisign signature verification failed")
+        return False
+    print("I: minisign signature verified")
+    return True
+
+
+def download(args):
+    session = get_session(args.jobs)
+    latest_iso_url = args.url or find_latest_iso(session)
+    filename = os.path.join(args.output_dir, unquote(os.path.basename(latest_iso_url)))
     print(filename)
     if os.path.exists(filename):
         print("{} already exists".format(filename))
         sys.exit(0)
-    r = requests.get(latest_iso_url)
-    with open(filename, 'wb') as fd:
-        for chunk in r.iter_content(chunk_size=128):
-            fd.write(chunk)
+
+    segmented = SegmentedDownload(session, latest_iso_url, filename, args.jobs, args.segment_size * 1024 * 1024)
+    segmented.run()
+    if not args.no_verify and not verify(session, latest_iso_url, segmented.part_file, filename, args):
+        # a corrupt download must not be resumed
+        os.unlink(segmented.part_file)
+        os.unlink(segmented.state_file)
+        sys.exit(1)
+    os.replace(segmented.part_file, filename)
+    if os.path.exists(segmented.state_file):
+        os.unlink(segmented.state_file)
 
 
 if __name__ == '__main__':
-    download()
+    parser = argparse.ArgumentParser(description='Download the latest rolling release ISO.')
+    parser.add_argument('--url', help='Download this ISO instead of the latest rolling release')
+    parser.add_argument('--output-dir', help='Directory to download to (default: current directory)', default='.')
+    parser.add_argument('--jobs', help='Number of parallel connections (default: %(default)s)', type=int, default=8)
+    parser.add_argument('--segment-size', help='Size of a Range segment in MB (default: %(default)s)',
+                        type=int, default=16)
+    parser.add_argument('--sha256', help='Expected sha256 checksum, instead of the published one')
+    parser.add_argument('--public-key', help='minisign public key (default: the VyOS release key)',
+                        default=PUBLIC_KEY)
+    parser.add_argument('--require-signature', help='Fail if the signature cannot be verified',
+                        action='store_true')
+    parser.add_argument('--no-verify', help='Skip checksum and signature verification', action='store_true')
+    download(parser.parse_args())